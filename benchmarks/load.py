@@ -0,0 +1,229 @@
+"""Нагрузочный тест обработчиков и запросов бота
+
+Настоящие обработчики из src.bot.handlers получают обновления от N одновременных
+пользователей, которые проходят циклы: /start, ответ, "Дальше", добавление и удаление слова.
+Запросы к Telegram перехватываются заглушкой, база - локальный Postgres из .env
+или временный файл SQLite. В конце печатаются p50/p95/p99 задержки каждого
+обработчика и каждой функции запросов, а также пропускная способность.
+
+Запуск:
+    python -m benchmarks.load --users 50 --cycles 20
+    python -m benchmarks.load --db postgres --words 50000
+"""
+import argparse
+import functools
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+_timings: dict[str, list[float]] = defaultdict(list)
+_timings_lock = threading.Lock()
+
+def _record(name: str, seconds: float) -> None:
+    with _timings_lock:
+        _timings[name].append(seconds)
+
+def _timed(name: str, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(name, time.perf_counter() - started)
+    return wrapper
+
+class FakeResponse:
+    """Ответ заглушки Bot API в формате requests.Response"""
+
+    def __init__(self, result):
+        self.status_code = 200
+        self.reason = "OK"
+        self._json = {'ok': True, 'result': result}
+        self.text = json.dumps(self._json)
+
+    def json(self):
+        return self._json
+
+class FakeTransport:
+    """Заглушка HTTP-запросов TeleBot с настраиваемой задержкой ответа"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        params = kwargs.get('params') or {}
+        if url.endswith('/sendMessage'):
+            with self._lock:
+                self.sent += 1
+            return FakeResponse({
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'text': params.get('text', ''),
+            })
+        return FakeResponse(True)
+
+def _configure_environment(args) -> None:
+    """Задает настройки до импорта модулей бота: они читают их при импорте"""
+    defaults = {
+        'DB_HOST': 'localhost', 'DB_PORT': '5432', 'DB_USER': 'bench', 'DB_PASS': 'bench', 'DB_NAME': 'bench',
+        'TG_TOKEN': '123456:BENCHMARK',
+        # Лимиты Telegram в заглушке не действуют, иначе очередь отправки искажает замеры
+        'OUTBOX_GLOBAL_RATE': '1000000', 'OUTBOX_CHAT_RATE': '1000000', 'OUTBOX_CHAT_BURST': '1000000',
+    }
+    if args.db == 'sqlite':
+        os.environ['DB_BACKEND'] = 'sqlite'
+        os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+        os.environ.pop('DB_URL', None)
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+class Simulation:
+    def __init__(self, args):
+        from telebot import apihelper, types
+        from src.bot.core import get_bot, get_outbox
+        from src.bot import handlers, queries
+        from src.bot.session import CardSession
+
+        self.args = args
+        self.types = types
+        self.bot = bot = get_bot()
+        self.outbox = outbox = get_outbox()
+        handlers.register_handlers(bot, outbox)
+        self.CardSession = CardSession
+        self.get_words_by_ids = queries.get_words_by_ids
+        self.transport = FakeTransport(args.api_latency / 1000)
+        apihelper.CUSTOM_REQUEST_SENDER = self.transport
+        # Обработчики выполняются в потоке пользователя, чтобы замерять их напрямую
+        bot.threaded = False
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self.updates = 0
+
+        for handler in bot.message_handlers:
+            handler['function'] = _timed(f"handler.{handler['function'].__name__}", handler['function'])
+
+        query_functions = ['get_or_create_user', 'next_card', 'get_card', 'get_random_words', 'get_user_words', 'count_user_words',
+                           'get_words_by_ids', 'add_user_word', 'delete_user_word', 'record_answer', 'skip_word']
+        for name in query_functions:
+            timed = _timed(f"query.{name}", getattr(queries, name))
+            setattr(queries, name, timed)
+            if hasattr(handlers, name):
+                setattr(handlers, name, timed)
+
+    def send(self, user_id: int, text: str) -> None:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        update = self.types.Update.de_json({'update_id': next(self._update_ids), 'message': message})
+        if self.args.think_time:
+            time.sleep(self.args.think_time / 1000)
+        started = time.perf_counter()
+        self.bot.process_new_updates([update])
+        _record("update", time.perf_counter() - started)
+
+    def current_card(self, user_id: int):
+        data = self.bot.current_states.get_data(user_id, user_id, bot_id=self.bot.bot_id)
+        card = self.CardSession.load(data.get('card'))
+        if card is None:
+            return None, None
+        return card, self.get_words_by_ids(data.get('user_id'), list(card.option_ids))
+
+    def run_user(self, user_id: int) -> None:
+        from src.bot.states import Command
+
+        rng = random.Random(user_id)
+        self.send(user_id, '/start')
+        for cycle in range(self.args.cycles):
+            card, words = self.current_card(user_id)
+            if card is not None:
+                if rng.random() < 0.3:
+                    wrong = [w for w in card.option_ids if w != card.word_id]
+                    if wrong:
+                        self.send(user_id, words[wrong[0]]['eng'])
+                self.send(user_id, words[card.word_id]['eng'])
+            self.send(user_id, Command.NEXT)
+
+            if cycle % 5 == 0:
+                self.send(user_id, Command.ADD_WORD)
+                self.send(user_id, f"Слово{'а' * (cycle // 5 + 1)}")
+                self.send(user_id, f"Bench{chr(ord('a') + user_id % 26)}{'x' * (cycle // 5 + 1)}")
+                self.send(user_id, Command.DELETE_WORD)
+
+    def run(self) -> float:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.users) as pool:
+            for future in [pool.submit(self.run_user, user_id) for user_id in range(1, self.args.users + 1)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        self.outbox.close()
+        return elapsed
+
+def _letters(index: int, alphabet: str) -> str:
+    """Номер index, записанный буквами alphabet: цифры в словах не проходят проверку при загрузке"""
+    letters = []
+    while True:
+        index, digit = divmod(index, len(alphabet))
+        letters.append(alphabet[digit])
+        if not index:
+            return "".join(letters)
+
+def _report(elapsed: float, sent: int) -> None:
+    updates = len(_timings.get("update", []))
+    print(f"Обновлений: {updates} за {elapsed:.2f} с, {updates / elapsed:.1f} обновлений/с, отправлено сообщений: {sent}")
+    print(f"{'':32} {'calls':>7} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9}")
+    for name in sorted(_timings):
+        values = sorted(_timings[name])
+        if len(values) > 1:
+            q = statistics.quantiles(values, n=100, method='inclusive')
+            p50, p95, p99 = q[49], q[94], q[98]
+        else:
+            p50 = p95 = p99 = values[0]
+        print(f"{name:32} {len(values):7} {p50 * 1000:9.2f} {p95 * 1000:9.2f} {p99 * 1000:9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument('--users', type=int, default=20, help="количество одновременных пользователей")
+    parser.add_argument('--cycles', type=int, default=10, help="сколько циклов проходит каждый пользователь")
+    parser.add_argument('--db', choices=['sqlite', 'postgres'], default='sqlite', help="база: временный SQLite или Postgres из .env")
+    parser.add_argument('--words', type=int, default=1000, help="сколько слов загрузить в базовый словарь перед тестом")
+    parser.add_argument('--api-latency', type=float, default=0, help="задержка ответа заглушки Telegram, мс")
+    parser.add_argument('--think-time', type=float, default=0, help="пауза пользователя перед каждым сообщением, мс")
+    args = parser.parse_args()
+
+    _configure_environment(args)
+
+    from src.database.base import create_tables
+    from src.database.distractors import rebuild_distractors
+    from src.database.importer import import_words
+    create_tables()
+    if args.words:
+        import_words(((f"Бенч{_letters(i, 'абвгдежзиклмнопрстуфхцчшщэюя')}", f"Bench{_letters(i, 'abcdefghijklmnopqrstuvwxyz')}")
+                      for i in range(args.words)), is_main=True)
+    rebuild_distractors()
+
+    simulation = Simulation(args)
+    elapsed = simulation.run()
+    _report(elapsed, simulation.transport.sent)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from functools import cache
+from telebot import asyncio_filters, asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from src.bot.aio.storage import create_async_state_storage
+from src.bot.states import Command, MyStates
+from src.config import settings
+
+@cache
+def get_bot() -> AsyncTeleBot:
+    """Бот создается при первом обращении, обработчики регистрирует src.bot.aio.handlers.register_handlers"""
+    if settings.TG_API_URL:
+        asyncio_helper.API_URL = settings.TG_API_URL
+
+    bot = AsyncTeleBot(settings.TELEGRAM_TOKEN, state_storage=create_async_state_storage())
+    bot.add_custom_filter(asyncio_filters.StateFilter(bot))
+    return bot
@@ -0,0 +1,121 @@
+"""Локальная заглушка Telegram Bot API для офлайн-проверки режима вебхука
+
+Сервер отвечает на методы Bot API по адресу /bot<token>/<method>
+и запоминает отправленные ботом сообщения. Он же умеет отправлять
+боту обновления на вебхук от имени пользователей.
+
+Запуск вместе с ботом:
+    TG_API_URL=http://127.0.0.1:8081/bot{0}/{1} BOT_MODE=webhook python -m src.main
+    python -m src.bot.aio.fake_telegram --users 100
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from aiohttp import ClientSession, web
+
+class FakeTelegram:
+    """Заглушка Bot API
+
+    Args:
+        webhook_url (str): Адрес вебхука бота, на который отправляются обновления
+        host (str): Адрес, на котором слушает заглушка
+        port (int): Порт, на котором слушает заглушка
+    """
+
+    def __init__(self, webhook_url: str, host: str = "127.0.0.1", port: int = 8081):
+        self.webhook_url = webhook_url
+        self.host = host
+        self.port = port
+        self.sent: list[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._runner = None
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = dict(await request.post()) if request.can_read_body else {}
+
+        if method == 'sendMessage':
+            self.sent.append(params)
+            result = self._message(int(params['chat_id']), params.get('text', ''), from_bot=True)
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        else:
+            # setWebhook, deleteWebhook, setMyCommands и прочие методы просто подтверждаем
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+    def _message(self, user_id: int, text: str, from_bot: bool = False) -> dict:
+        user = {'id': user_id, 'is_bot': from_bot, 'first_name': f"User{user_id}", 'username': f"user{user_id}"}
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return message
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle_method)
+        app.router.add_get('/bot{token}/{method}', self._handle_method)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def send_update(self, session: ClientSession, user_id: int, text: str) -> int:
+        """Отправляет боту сообщение пользователя, возвращает HTTP-статус вебхука"""
+        update = {'update_id': next(self._update_ids), 'message': self._message(user_id, text)}
+        async with session.post(self.webhook_url, data=json.dumps(update), headers={'Content-Type': 'application/json'}) as resp:
+            return resp.status
+
+async def simulate(telegram: FakeTelegram, users: int, steps: int):
+    """Каждый пользователь пишет /start и несколько раз нажимает "Дальше" """
+    from src.bot.states import Command
+
+    async def user_session(session, user_id):
+        await telegram.send_update(session, user_id, '/start')
+        for _ in range(steps):
+            await asyncio.sleep(0.1)
+            await telegram.send_update(session, user_id, Command.NEXT)
+
+    async with ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(session, user_id) for user_id in range(1, users + 1)))
+        elapsed = time.perf_counter() - started
+
+    print(f"Отправлено {users * (steps + 1)} обновлений за {elapsed:.2f} с, получено ответов бота: {len(telegram.sent)}")
+
+async def main(args):
+    telegram = FakeTelegram(args.webhook, args.host, args.port)
+    await telegram.start()
+    try:
+        if args.users:
+            await simulate(telegram, args.users, args.steps)
+            # Даем боту дослать ответы
+            await asyncio.sleep(args.wait)
+            print(f"Всего ответов бота: {len(telegram.sent)}")
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await telegram.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument('--webhook', default="http://127.0.0.1:8080/webhook", help="адрес вебхука бота")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--users', type=int, default=0, help="сколько пользователей симулировать, 0 - только заглушка")
+    parser.add_argument('--steps', type=int, default=3, help="сколько раз каждый пользователь нажимает \"Дальше\"")
+    parser.add_argument('--wait', type=float, default=2.0, help="сколько секунд ждать ответов после симуляции")
+    asyncio.run(main(parser.parse_args()))
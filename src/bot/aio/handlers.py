@@ -0,0 +1,325 @@
+"""Асинхронные обработчики для режима вебхука, повторяют src.bot.handlers"""
+import asyncio
+import io
+import textwrap
+import random
+from typing import Optional
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from src.bot.states import Command, MyStates
+from src.bot.aio.queries import get_or_create_user, add_user_word, delete_user_word, next_card, count_user_words, get_words_by_ids, record_answer, skip_word, log_answer, get_user_stats
+from src.bot.queries import import_user_words
+from src.bot.session import CardSession, find_option, render_markup
+from src.config import settings
+from src.database.validation import MAX_WORD_LENGTH, is_eng_word, is_rus_word
+from src.metrics import timed
+
+# Бот, с которым работают обработчики, задается в register_handlers
+bot: Optional[AsyncTeleBot] = None
+
+async def create_cards(message, user_id, previous_word = ""):
+    """Выводим слово для конкретного клиента"""
+    card_words = await next_card(user_id, previous_word)
+
+    if not card_words:
+        markup = types.ReplyKeyboardMarkup(row_width=2)
+        markup.add(types.KeyboardButton(Command.ADD_WORD))
+        await bot.send_message(message.chat.id, "Слова не найдены, попробуйте добавить слово", reply_markup=markup)
+        return False
+
+    await bot.set_state(message.from_user.id, MyStates.target_word, message.chat.id)
+
+    current_word, words = card_words
+    random.shuffle(words)
+    card = CardSession(current_word['id'], tuple(word['id'] for word in words))
+
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        data['card'] = card.dump()
+        data['user_id'] = user_id
+
+    markup = render_markup(card, {word['id']: word for word in words})
+    await bot.send_message(message.chat.id, f"Выбери перевод слова:\n🇷🇺 {current_word['rus']}", reply_markup=markup)
+
+async def load_card(user_id, card_data):
+    """Восстанавливает карточку из состояния и слова ее вариантов ответа"""
+    card = CardSession.load(card_data)
+    if not user_id or card is None:
+        return None, None
+
+    words = await get_words_by_ids(user_id, list(card.option_ids))
+    if words is None:
+        return None, None
+    return card, words
+
+
+@timed("handler")
+async def start(message):
+    """Обработчик команд /start и /cards для начала работы с ботом."""
+    user_id, user_was_exist = await get_or_create_user(message.from_user.id, message.from_user.username)
+
+    if user_id is None:
+        await bot.send_message(message.chat.id, "Произошла ошибка, попробуйте позже")
+        return
+
+    if user_was_exist:
+        text = f"С возвращением, {message.from_user.first_name}"
+    else:
+        text = textwrap.dedent(
+            "Привет 👋 Давай попрактикуемся в английском языке. Тренировки можешь проходить в удобном для себя темпе.\n"
+            "У тебя есть возможность использовать тренажёр, как конструктор, и собирать свою собственную базу для обучения. Для этого воспользуйся инструментами:\n"
+            "   добавить слово ➕,\n"
+            "   удалить слово 🔙.\n"
+            "Ну что, начнём ⬇️")
+
+    await bot.send_message(message.chat.id, text)
+    await create_cards(message, user_id)
+
+@timed("handler")
+async def next_cards(message):
+    """Обработчик команд "Далее" и "Отмена" """
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+        card_data = data.get('card')
+    card, words = await load_card(user_id, card_data)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    if not card:
+        await bot.send_message(message.chat.id, "Что то пошло не так! Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    if message.text == Command.NEXT:
+        # Без записи в расписании пропущенное слово сразу выпало бы снова.
+        # Если перед пропуском была ошибка, слово повторяется как забытое
+        if card.wrong_mask:
+            await record_answer(user_id, card.word_id, False)
+        else:
+            await skip_word(user_id, card.word_id)
+
+    await create_cards(message, user_id, words[card.word_id]['rus'])
+
+@timed("handler")
+async def delete_word(message):
+    """Обработчик команды удаления слова из коллекции пользователя"""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+        card_data = data.get('card')
+    card, words = await load_card(user_id, card_data)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Пропишите /start для начала работы:", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    if not card:
+        await bot.send_message(message.chat.id, "Не удалось определить слово для удаления")
+        await create_cards(message, user_id)
+        return
+
+    current_word = words[card.word_id]
+    if await delete_user_word(user_id, current_word):
+        response_text = f"Слово \"{current_word.get('rus', '')}\" удалено!"
+    else:
+        response_text = f"Слово \"{current_word.get('rus', '')}\" является базовым. Его нельзя удалить!"
+
+    await bot.send_message(message.chat.id, response_text)
+    await create_cards(message, user_id, current_word.get('rus'))
+
+@timed("handler")
+async def add_word(message):
+    """Обработчик команды добавления нового слова в коллекцию пользователя."""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    markup = types.ReplyKeyboardMarkup(row_width=2)
+    markup.add(types.KeyboardButton(Command.CANCEL))
+
+    await bot.send_message(message.chat.id, "Напишите какое слово хотите добавить:", reply_markup=markup)
+    await bot.set_state(message.from_user.id, MyStates.wait_word, message.chat.id)
+
+@timed("handler")
+async def import_words_command(message):
+    """Обработчик команды массовой загрузки слов из файла"""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    markup = types.ReplyKeyboardMarkup(row_width=2)
+    markup.add(types.KeyboardButton(Command.CANCEL))
+
+    await bot.send_message(message.chat.id, "Отправьте файл CSV с колонками rus, eng или JSON со словами", reply_markup=markup)
+    await bot.set_state(message.from_user.id, MyStates.wait_import, message.chat.id)
+
+@timed("handler")
+async def handle_import_file(message):
+    """Обработчик файла со словами, загрузка идет в отдельном потоке"""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id')
+
+    file_name = (message.document.file_name or "").lower()
+    fmt = "json" if file_name.endswith((".json", ".jsonl")) else "csv"
+    if (message.document.file_size or 0) > settings.IMPORT_MAX_FILE_SIZE:
+        await bot.send_message(message.chat.id, f"Файл больше {settings.IMPORT_MAX_FILE_SIZE // 1024} КБ, загрузите его частями")
+        return
+
+    content = await bot.download_file((await bot.get_file(message.document.file_id)).file_path)
+
+    try:
+        stream = io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", newline="")
+        result = await asyncio.to_thread(import_user_words, user_id, stream, fmt)
+    except (ValueError, KeyError, TypeError):
+        await bot.send_message(message.chat.id, "Не удалось прочитать файл, проверьте его формат")
+        return
+
+    if result is None:
+        await bot.send_message(message.chat.id, "Произошла ошибка, попробуйте позже")
+        return
+
+    text = f"Добавлено слов: {result.linked}, пропущено: {result.skipped}"
+    if result.invalid:
+        text += f"\nНе подошли по формату: {result.invalid} (одно слово, русское и английское, до {MAX_WORD_LENGTH} символов)"
+    if result.truncated:
+        text += f"\nЗагружены только первые {settings.IMPORT_MAX_WORDS} строк файла"
+    await bot.send_message(message.chat.id, text)
+    await create_cards(message, user_id)
+
+@timed("handler")
+async def handle_wait_translate(message):
+    """Обработчик ввода перевода на английском"""
+    word_translation = message.text
+    if len(word_translation.split()) != 1:
+        await bot.send_message(message.chat.id, f"Укажите одно слово")
+        return
+
+    if len(word_translation) > MAX_WORD_LENGTH:
+        await bot.send_message(message.chat.id, f"Слово должно быть не длиннее {MAX_WORD_LENGTH} символов")
+        return
+
+    if not is_eng_word(word_translation):
+        await bot.send_message(message.chat.id, f"Укажите слово на английском")
+        return
+
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        new_rus_word = data.get('new_rus_word')
+        user_id = data.get('user_id')
+
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    word_translation = word_translation.strip().replace(" ", "").capitalize()
+
+    user_word_success, user_word_message = await add_user_word(user_id, new_rus_word, word_translation)
+    await bot.send_message(message.chat.id, user_word_message)
+    if user_word_success:
+        count_words = await count_user_words(user_id)
+        if count_words:
+            await bot.send_message(message.chat.id, f"Сейчас вы изучаете {count_words} слов")
+    await create_cards(message, user_id, new_rus_word)
+
+@timed("handler")
+async def handle_wait_word(message):
+    """Обработчик ввода слова на русском"""
+    word = message.text.strip()
+    if len(word.split()) != 1:
+        await bot.send_message(message.chat.id, f"Укажите одно слово")
+        return
+
+    if len(word) > MAX_WORD_LENGTH:
+        await bot.send_message(message.chat.id, f"Слово должно быть не длиннее {MAX_WORD_LENGTH} символов")
+        return
+
+    if not is_rus_word(word):
+        await bot.send_message(message.chat.id, f"Укажите слово на русском")
+        return
+
+    word = word.replace(" ", "").capitalize()
+
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        data['new_rus_word'] = word
+
+    await bot.send_message(message.chat.id, f"Укажите перевод слова {word}")
+    await bot.set_state(message.from_user.id, MyStates.wait_translate, message.chat.id)
+
+@timed("handler")
+async def stats(message):
+    """Обработчик команды /stats: счетчики ответов пользователя"""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    user_stats = await get_user_stats(user_id)
+    if user_stats is None:
+        await bot.send_message(message.chat.id, "Произошла ошибка, попробуйте позже")
+        return
+
+    answers, correct = user_stats['answers'], user_stats['correct']
+    accuracy = round(100 * correct / answers) if answers else 0
+    text = f"📊 Статистика\nОтветов: {answers}\nВерных: {correct} ({accuracy}%)"
+    words_count = await count_user_words(user_id)
+    if words_count is not None:
+        text += f"\nСлов в словаре: {words_count}"
+    await bot.send_message(message.chat.id, text)
+
+@timed("handler")
+async def message_reply(message):
+    """Обработчик основного взаимодействия с пользователем"""
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+        card_data = data.get('card')
+    card, words = await load_card(user_id, card_data)
+
+    if not user_id:
+        await bot.send_message(message.chat.id, "Для начала работы бота напишите /start", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    if not card:
+        await bot.send_message(message.chat.id, "Сессия завершена. Начните заново /start")
+        await bot.delete_state(message.from_user.id, message.chat.id)
+        return
+
+    text = message.text.replace('❌', '').strip()
+    current_word = words[card.word_id]
+
+    if text.lower() == current_word['eng'].lower():
+        hint = f"Верный ответ!\n {current_word['rus']} -> {current_word['eng']}"
+        await bot.send_message(message.chat.id, hint, reply_markup=types.ReplyKeyboardRemove())
+        await bot.delete_state(message.from_user.id, message.chat.id)
+        log_answer(user_id, card.word_id, True)
+        await record_answer(user_id, card.word_id, card.wrong_mask == 0)
+        await create_cards(message, user_id, current_word['rus'])
+    else:
+        log_answer(user_id, card.word_id, False)
+        option_index = find_option(card, words, text)
+        if option_index is not None:
+            card.mark_wrong(option_index)
+
+        async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+            data['card'] = card.dump()
+
+        hint = f"Допущена ошибка!\n Попробуй ещё раз вспомнить слово 🇷🇺{current_word['rus']}"
+        await bot.send_message(message.chat.id, hint, reply_markup=render_markup(card, words))
+
+def register_handlers(telegram_bot: AsyncTeleBot) -> None:
+    """Регистрирует обработчики в боте"""
+    global bot
+    bot = telegram_bot
+
+    bot.register_message_handler(start, commands=['cards', 'start'])
+    bot.register_message_handler(next_cards, func=lambda message: message.text in (Command.NEXT, Command.CANCEL))
+    bot.register_message_handler(delete_word, func=lambda message: message.text == Command.DELETE_WORD)
+    bot.register_message_handler(add_word, func=lambda message: message.text == Command.ADD_WORD)
+    bot.register_message_handler(import_words_command, commands=['import'])
+    bot.register_message_handler(stats, commands=['stats'])
+    bot.register_message_handler(handle_import_file, content_types=['document'], state=MyStates.wait_import)
+    bot.register_message_handler(handle_wait_translate, state=MyStates.wait_translate)
+    bot.register_message_handler(handle_wait_word, state=MyStates.wait_word)
+    bot.register_message_handler(message_reply, func=lambda message: True)
@@ -0,0 +1,215 @@
+"""Асинхронные версии запросов из src.bot.queries для режима вебхука
+
+Контракты функций совпадают с синхронными, кэш колод и снимок базового словаря общие.
+"""
+import asyncio
+from typing import Dict, List, Optional
+from sqlalchemy import delete, exc, select
+from src.bot.queries import get_base_dictionary_cache, get_card_prefetch, get_deck_cache, get_card as sync_get_card, log_answer, _add_user_word, _add_word_message, _find_words, _own_words, _own_words_count, _pick_target_id, _record_answer, _record_skip, _sample_words, _similar_words, _with_distractors, _with_pending_answers
+from src.bot.snapshot import BaseDictionary
+from src.database.base import AsyncSession
+from src.database.models import Review, User, UserStats, UserWord, Word
+from src.metrics import log_error, timed
+
+async def _base_dictionary() -> BaseDictionary:
+    """Снимок базового словаря, сверка версии с базой выполняется в отдельном потоке"""
+    base = get_base_dictionary_cache().peek()
+    return base if base is not None else await asyncio.to_thread(get_base_dictionary_cache().get)
+
+@timed("query")
+async def get_user_words(user_id: int) -> Optional[list[tuple[str, str]]]:
+    """Получает список слов пользователя в формате (русское, английское)"""
+    try:
+        base = await _base_dictionary()
+        own = await _get_own_words(user_id)
+        pairs = list(zip(base.rus, base.eng)) + [(word['rus'], word['eng']) for word in own]
+        return pairs or None
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+async def count_user_words(user_id: int) -> Optional[int]:
+    """Получает количество слов, которые видит пользователь"""
+    try:
+        base = await _base_dictionary()
+        deck_cache = get_deck_cache()
+        own = deck_cache.get(user_id) if deck_cache.enabled else None
+        if own is not None:
+            return len(base) + len(own)
+
+        async with AsyncSession() as session:
+            return len(base) + await session.scalar(_own_words_count(user_id))
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+async def get_words_by_ids(user_id: int, word_ids: List[int]) -> Optional[Dict[int, Dict]]:
+    """Получает слова по id: базовые из снимка словаря, остальные из кэша слов пользователя или базы"""
+    try:
+        words, missing = _find_words(await _base_dictionary(), get_deck_cache().get(user_id), word_ids)
+        if missing:
+            async with AsyncSession() as session:
+                words.update((word.id, word.to_dict()) for word in await session.scalars(select(Word).where(Word.id.in_(missing))))
+        return words if len(words) == len(set(word_ids)) else None
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+async def _get_own_words(user_id: int) -> List[Dict]:
+    """Возвращает собственные слова пользователя из кэша, при промахе загружает их из базы"""
+    deck_cache = get_deck_cache()
+    if deck_cache.enabled:
+        own = deck_cache.get(user_id)
+        if own is not None:
+            return own
+
+    async with AsyncSession() as session:
+        own = [word.to_dict() for word in await session.scalars(_own_words(user_id))]
+
+    deck_cache.put(user_id, own)
+    return own
+
+@timed("query")
+async def get_or_create_user(telegram_id: int, telegram_username: str) -> tuple[Optional[int], bool]:
+    """Проверка на пользователя
+
+    Returns:
+        tuple[int, bool]: ID пользователя (None при ошибке) и признак того, что он уже существовал
+    """
+    try:
+        async with AsyncSession() as session:
+            user_id = await session.scalar(select(User.id).where(User.telegram_id == telegram_id))
+            if user_id:
+                return user_id, True
+
+            user = User(telegram_id=telegram_id, telegram_username=telegram_username)
+            session.add(user)
+            await session.commit()
+            return user.id, False
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None, False
+
+@timed("query")
+async def get_random_words(user_id: int, previous_word: str, limit: int = 4) -> Optional[List[Dict]]:
+    """Получить рандомно определенное количество слов, исключая предыдущее"""
+    try:
+        return _sample_words(await _base_dictionary(), await _get_own_words(user_id), previous_word, limit) or None
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+async def get_card(user_id: int, previous_word: str, limit: int = 4) -> Optional[tuple[Dict, List[Dict]]]:
+    """Выбирает слово для карточки по расписанию повторений и варианты ответа"""
+    try:
+        base = await _base_dictionary()
+        async with AsyncSession() as session:
+            target_id = await session.run_sync(_pick_target_id, user_id, previous_word, base)
+            await session.commit()
+            target = await session.get(Word, target_id) if target_id is not None else None
+            if target is None:
+                return None
+            target = target.to_dict()
+            similar = await session.run_sync(_similar_words, user_id, target_id, previous_word, limit)
+
+        options = _with_distractors(target, similar, limit)
+        if len(options) < limit:
+            options = _with_distractors(target, similar + (await get_random_words(user_id, previous_word, limit * 2) or []), limit)
+        return target, options
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+async def next_card(user_id: int, previous_word: str, limit: int = 4) -> Optional[tuple[Dict, List[Dict]]]:
+    """Карточка для показа, логика как в src.bot.queries.next_card
+
+    Следующие карточки готовятся в фоновых потоках синхронной версией get_card.
+    """
+    card = get_card_prefetch().pop(user_id, previous_word)
+    if card is None:
+        card = await get_card(user_id, previous_word, limit)
+    if card is not None:
+        get_card_prefetch().refill(user_id, card[0], lambda word, exclude_ids: sync_get_card(user_id, word, limit, exclude_ids))
+    return card
+
+@timed("query")
+async def record_answer(user_id: int, word_id: int, correct: bool) -> bool:
+    """Обновляет расписание повторения слова по результату ответа"""
+    try:
+        async with AsyncSession() as session:
+            await session.run_sync(_record_answer, user_id, word_id, correct)
+            await session.commit()
+        return True
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False
+
+@timed("query")
+async def skip_word(user_id: int, word_id: int) -> bool:
+    """Откладывает слово пропущенной карточки, как src.bot.queries.skip_word"""
+    try:
+        async with AsyncSession() as session:
+            await session.run_sync(_record_skip, user_id, word_id)
+            await session.commit()
+        return True
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False
+
+@timed("query")
+async def get_user_stats(user_id: int) -> Optional[Dict]:
+    """Счетчики ответов пользователя, как в src.bot.queries.get_user_stats"""
+    try:
+        async with AsyncSession() as session:
+            row = (await session.execute(
+                select(UserStats.answers, UserStats.correct).where(UserStats.id_user == user_id)
+            )).first()
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+    return _with_pending_answers(user_id, row)
+
+@timed("query")
+async def add_user_word(user_id: int, rus_word: str, eng_word: str) -> tuple[bool, str]:
+    """Добавление слова в словарь пользователя, логика как в src.bot.queries.add_user_word"""
+    try:
+        async with AsyncSession() as session:
+            number, linked = await session.run_sync(_add_user_word, user_id, rus_word, eng_word)
+            await session.commit()
+        if number or linked:
+            get_deck_cache().invalidate(user_id)
+            get_card_prefetch().invalidate(user_id)
+        return _add_word_message(number, linked)
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False, f"Ошибка базы данных: {e}"
+
+@timed("query")
+async def delete_user_word(user_id: int, word: dict) -> bool:
+    """Удаление слова пользователя, True при удалении, иначе False"""
+    try:
+        async with AsyncSession() as session:
+            result = await session.execute(delete(UserWord).where(UserWord.id_user == user_id, UserWord.id_word == word['id']))
+            if result.rowcount:
+                await session.execute(delete(Review).where(Review.id_user == user_id, Review.id_word == word['id']))
+            await session.commit()
+        if not result.rowcount:
+            return False
+        get_deck_cache().invalidate(user_id)
+        get_card_prefetch().invalidate(user_id)
+        return True
+
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False
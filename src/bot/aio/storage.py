@@ -0,0 +1,60 @@
+import asyncio
+from telebot.asyncio_storage import StateMemoryStorage
+from telebot.asyncio_storage.base_storage import StateDataContext, StateStorageBase
+from src.bot.storage import DatabaseStateStorage, create_state_storage
+
+class AsyncDatabaseStateStorage(StateStorageBase):
+    """Хранилище состояний AsyncTeleBot поверх DatabaseStateStorage
+
+    Обращения к хранилищу выполняются в отдельном потоке, чтобы чтение из базы
+    не останавливало цикл событий.
+
+    Args:
+        storage (DatabaseStateStorage): Синхронное хранилище состояний
+    """
+
+    def __init__(self, storage: DatabaseStateStorage) -> None:
+        self.storage = storage
+
+    async def set_state(self, chat_id, user_id, state, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await asyncio.to_thread(self.storage.set_state, chat_id, user_id, state,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def get_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return await asyncio.to_thread(self.storage.get_state, chat_id, user_id,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def delete_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await asyncio.to_thread(self.storage.delete_state, chat_id, user_id,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def set_data(self, chat_id, user_id, key, value,
+                       business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await asyncio.to_thread(self.storage.set_data, chat_id, user_id, key, value,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def get_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> dict:
+        return await asyncio.to_thread(self.storage.get_data, chat_id, user_id,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def reset_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await asyncio.to_thread(self.storage.reset_data, chat_id, user_id,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    async def save(self, chat_id, user_id, data: dict, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await asyncio.to_thread(self.storage.save, chat_id, user_id, data,
+                                       business_connection_id, message_thread_id, bot_id)
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return StateDataContext(self, chat_id=chat_id, user_id=user_id, business_connection_id=business_connection_id,
+                                message_thread_id=message_thread_id, bot_id=bot_id)
+
+    def __str__(self) -> str:
+        return f"<AsyncDatabaseStateStorage: {self.storage.engine.url}>"
+
+def create_async_state_storage() -> StateStorageBase:
+    """Хранилище состояний для режима вебхука, выбранное в настройках STATE_STORAGE, см. create_state_storage"""
+    storage = create_state_storage()
+    if isinstance(storage, DatabaseStateStorage):
+        return AsyncDatabaseStateStorage(storage)
+    return StateMemoryStorage()
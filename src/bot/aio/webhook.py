@@ -0,0 +1,58 @@
+"""Прием обновлений Telegram через вебхук на локальном HTTP-сервере
+
+Каждое обновление обрабатывается в отдельной задаче asyncio, поэтому ответ
+Telegram возвращается сразу, а число одновременных пользователей
+не ограничено пулом потоков.
+"""
+import asyncio
+from aiohttp import web
+from telebot import types
+
+from src.bot.aio.core import get_bot
+from src.bot.aio.handlers import register_handlers
+from src.bot.queries import get_answer_log
+from src.config import settings
+from src.database.base import get_async_engine, warm_async_pool
+
+_tasks: set[asyncio.Task] = set()
+
+async def handle_update(request: web.Request) -> web.Response:
+    """Принимает обновление и запускает его обработку в фоне"""
+    if settings.WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != settings.WEBHOOK_SECRET:
+        return web.Response(status=403)
+
+    update = types.Update.de_json(await request.text())
+    task = asyncio.create_task(get_bot().process_new_updates([update]))
+    # Храним ссылку на задачу, иначе сборщик мусора может прервать ее выполнение
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return web.Response()
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handle_update)
+    return app
+
+async def run_webhook():
+    """Запускает сервер вебхука и работает до отмены"""
+    bot = get_bot()
+    register_handlers(bot)
+    await warm_async_pool()
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+
+    if settings.WEBHOOK_URL:
+        await bot.set_webhook(settings.WEBHOOK_URL, secret_token=settings.WEBHOOK_SECRET or None)
+    print(f"Бот запущен! Вебхук слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        if _tasks:
+            await asyncio.gather(*_tasks, return_exceptions=True)
+        await bot.close_session()
+        await asyncio.to_thread(get_answer_log().close)
+        await get_async_engine().dispose()
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+from src.metrics import registry
+
+class DeckCache:
+    """LRU-кэш колод пользователей с ограничением времени жизни записи
+
+    Колода - это список собственных слов пользователя (словарей), базовые слова
+    хранятся один раз на процесс в снимке src.bot.snapshot.
+    Кэш потокобезопасен: обработчики TeleBot выполняются в пуле потоков.
+    Попадания, промахи и вытеснения выдаются в метриках bot_deck_cache_total
+    и bot_deck_cache_evictions_total.
+
+    Args:
+        maxsize (int): Максимальное количество колод в кэше, 0 - кэш выключен
+        ttl (float): Время жизни колоды в секундах
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._decks: OrderedDict[int, tuple[float, List[Dict]]] = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, user_id: int) -> Optional[List[Dict]]:
+        """Возвращает колоду пользователя или None, если ее нет или она устарела"""
+        with self._lock:
+            entry = self._decks.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._decks[user_id]
+                self.misses += 1
+                hit = False
+            else:
+                self._decks.move_to_end(user_id)
+                self.hits += 1
+                hit = True
+
+        if self.enabled:
+            registry.inc("bot_deck_cache_total", result="hit" if hit else "miss")
+        return entry[1] if hit else None
+
+    def put(self, user_id: int, deck: List[Dict]) -> None:
+        """Сохраняет колоду пользователя, вытесняя самую давнюю при переполнении"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._decks[user_id] = (time.monotonic() + self.ttl, deck)
+            self._decks.move_to_end(user_id)
+            evicted = 0
+            while len(self._decks) > self.maxsize:
+                self._decks.popitem(last=False)
+                evicted += 1
+        if evicted:
+            registry.inc("bot_deck_cache_evictions_total", evicted)
+
+    def invalidate(self, user_id: int) -> None:
+        """Удаляет колоду пользователя из кэша"""
+        with self._lock:
+            self._decks.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Удаляет все колоды"""
+        with self._lock:
+            self._decks.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов для подбора размера кэша"""
+        with self._lock:
+            return {'size': len(self._decks), 'hits': self.hits, 'misses': self.misses}
@@ -1,22 +1,29 @@
 import requests
-from telebot import TeleBot, custom_filters
-from telebot.storage import StateMemoryStorage
-from telebot.handler_backends import State, StatesGroup
+from functools import cache
+from telebot import TeleBot, apihelper, custom_filters
 
+from src.bot.outbox import Outbox
+from src.bot.states import Command, MyStates
+from src.bot.storage import create_state_storage
 from src.config import settings
 
-class Command:
-    ADD_WORD = 'Добавить слово ➕'
-    DELETE_WORD = 'Удалить слово🔙'
-    NEXT = 'Дальше ⏭'
-    CANCEL = 'Отмена ❌'
+@cache
+def get_bot() -> TeleBot:
+    """Бот создается при первом обращении, обработчики регистрирует src.bot.handlers.register_handlers"""
+    if settings.TG_API_URL:
+        apihelper.API_URL = settings.TG_API_URL
 
-class MyStates(StatesGroup):
-    target_word = State()
-    wait_word = State()
-    wait_translate = State()
+    bot = TeleBot(settings.TELEGRAM_TOKEN, state_storage=create_state_storage())
+    bot.add_custom_filter(custom_filters.StateFilter(bot))
+    return bot
 
-state_storage = StateMemoryStorage()
-bot = TeleBot(settings.TELEGRAM_TOKEN, state_storage=state_storage)
-bot.add_custom_filter(custom_filters.StateFilter(bot))
-print("Бот запущен!")
\ No newline at end of file
+@cache
+def get_outbox() -> Outbox:
+    """Очередь отправки процесса
+
+    OUTBOX_GLOBAL_RATE - лимит всего бота, поэтому процессы-обработчики диспетчера (DISPATCH_WORKERS)
+    делят его поровну. Лимит на чат не делится: чат обслуживает один процесс.
+    """
+    global_rate = settings.OUTBOX_GLOBAL_RATE / max(settings.DISPATCH_WORKERS, 1)
+    return Outbox(get_bot(), workers=settings.OUTBOX_WORKERS, global_rate=global_rate,
+                  chat_rate=settings.OUTBOX_CHAT_RATE, chat_burst=settings.OUTBOX_CHAT_BURST)
@@ -0,0 +1,321 @@
+"""Режим диспетчера: обновления распределяются по процессам-обработчикам
+
+Процесс-диспетчер получает обновления через long polling или вебхук и кладет их
+в очередь одного из DISPATCH_WORKERS процессов по id пользователя. Все обновления
+пользователя попадают в один процесс, поэтому его состояние MyStates остается
+локальным, а порядок сообщений сохраняется. Внутри процесса обновления снова
+делятся по пользователям между DISPATCH_THREADS потоками.
+
+Процессы присылают отметку жизни. Упавший или зависший процесс перезапускается,
+его очередь при этом сохраняется. SIGHUP плавно перезапускает процессы по одному:
+процесс дорабатывает свою очередь и только потом заменяется новым.
+"""
+import json
+import multiprocessing
+import queue
+import signal
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Optional
+from telebot import apihelper
+from src.config import settings
+
+# Как часто процесс-обработчик обновляет отметку жизни
+HEARTBEAT_INTERVAL = 1.0
+
+def update_user_id(update: dict) -> int:
+    """Id пользователя Telegram из обновления любого типа, 0 если его нет"""
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get('from') or value.get('user') or value.get('chat')
+            if isinstance(sender, dict) and 'id' in sender:
+                return sender['id']
+    return 0
+
+class _Lane:
+    """Поток процесса-обработчика, который по порядку обрабатывает обновления своей доли пользователей"""
+
+    def __init__(self, bot, index: int):
+        self.bot = bot
+        self.busy_since: Optional[float] = None
+        self._updates: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = Thread(target=self._run, name=f"lane-{index}", daemon=True)
+        self._thread.start()
+
+    def put(self, update: Optional[dict]) -> None:
+        self._updates.put(update)
+
+    def _run(self) -> None:
+        from telebot import types
+
+        while (update := self._updates.get()) is not None:
+            self.busy_since = time.monotonic()
+            try:
+                self.bot.process_new_updates([types.Update.de_json(update)])
+            except Exception as e:
+                print(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+            finally:
+                self.busy_since = None
+
+    def close(self) -> None:
+        self._updates.put(None)
+        self._thread.join()
+
+def _worker_main(index: int, updates, heartbeat, threads: int) -> None:
+    """Точка входа процесса-обработчика"""
+    # Ctrl+C получает вся группа процессов, останавливает обработчики диспетчер
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from src.bot.core import get_bot, get_outbox
+    from src.bot.handlers import register_handlers
+    from src.bot.queries import get_answer_log
+    from src.database.base import warm_pool
+    from src.metrics import start_metrics_server
+
+    bot, outbox = get_bot(), get_outbox()
+    register_handlers(bot, outbox)
+    # Потоки выделяет сам процесс по пользователям, пул потоков TeleBot не сохранил бы порядок
+    bot.threaded = False
+    warm_pool()
+    if settings.METRICS_PORT:
+        start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + 1 + index)
+
+    lanes = [_Lane(bot, i) for i in range(threads)]
+    while True:
+        now = time.monotonic()
+        # Отметка жизни не обновляется, пока какой-то поток завис на одном обновлении
+        if not any(lane.busy_since is not None and now - lane.busy_since > settings.DISPATCH_HEALTH_TIMEOUT for lane in lanes):
+            heartbeat.value = time.time()
+        try:
+            update = updates.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if update is None:
+            break
+        lanes[update_user_id(update) % threads].put(update)
+
+    for lane in lanes:
+        lane.close()
+    outbox.close()
+    get_answer_log().close()
+
+class _Worker:
+    """Процесс-обработчик и его очередь, очередь переживает перезапуски процесса"""
+
+    def __init__(self, context, index: int, threads: int):
+        self.context = context
+        self.index = index
+        self.threads = threads
+        self.updates = context.Queue()
+        self.heartbeat = context.Value('d', 0.0, lock=False)
+        self.process = None
+        self.restarting = False
+        # Обновления, пришедшие, пока очередь упавшего процесса переносится в новую
+        self.held: Optional[list] = None
+
+    def put(self, update: dict) -> None:
+        """Кладет обновление в очередь процесса, вызывается под блокировкой диспетчера"""
+        if self.held is not None:
+            self.held.append(update)
+        else:
+            self.updates.put(update)
+
+    def start(self) -> None:
+        # Время на запуск процесса дается как один интервал проверки
+        self.heartbeat.value = time.time()
+        self.process = self.context.Process(target=_worker_main, name=f"bot-worker-{self.index}",
+                                            args=(self.index, self.updates, self.heartbeat, self.threads))
+        self.process.start()
+
+    def healthy(self) -> bool:
+        return self.process.is_alive() and time.time() - self.heartbeat.value < settings.DISPATCH_HEALTH_TIMEOUT
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """Дает процессу доработать очередь и завершиться, False - не успел за timeout"""
+        self.updates.put(None)
+        self.process.join(timeout)
+        return not self.process.is_alive()
+
+    def kill(self) -> None:
+        """Принудительно завершает процесс и переносит его очередь в новую"""
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+        # Процесс мог погибнуть, держа блокировку очереди, поэтому дальше используется новая очередь.
+        # Если блокировка занята, оставшиеся обновления теряются
+        old, self.updates = self.updates, self.context.Queue()
+        try:
+            while True:
+                update = old.get(timeout=0.1)
+                if update is not None:
+                    self.updates.put(update)
+        except queue.Empty:
+            pass
+
+class Dispatcher:
+    """Распределяет обновления по процессам-обработчикам и следит за их здоровьем
+
+    Args:
+        workers (int): Количество процессов-обработчиков
+        threads (int): Количество потоков обработки в каждом процессе
+    """
+
+    def __init__(self, workers: int, threads: int):
+        # spawn: форк процесса с запущенными потоками может унаследовать захваченные блокировки
+        context = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(context, index, threads) for index in range(workers)]
+        self._lock = Lock()
+        self._stop = Event()
+        self._supervisor = Thread(target=self._supervise, name="dispatcher-supervisor", daemon=True)
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._supervisor.start()
+
+    def route(self, update: dict) -> None:
+        """Отправляет обновление в процесс, отвечающий за пользователя"""
+        with self._lock:
+            self._workers[update_user_id(update) % len(self._workers)].put(update)
+
+    def _replace(self, worker: _Worker) -> None:
+        """Принудительно перезапускает процесс, не задерживая обновления остальных процессов
+
+        Завершение процесса и перенос его очереди идут без блокировки диспетчера, новые
+        обновления для этого процесса тем временем копятся в памяти и ставятся в очередь
+        после перенесенных, поэтому порядок сообщений пользователя сохраняется.
+        """
+        with self._lock:
+            worker.held = []
+        try:
+            worker.kill()
+        finally:
+            with self._lock:
+                for update in worker.held:
+                    worker.updates.put(update)
+                worker.held = None
+                if not self._stop.is_set():
+                    worker.start()
+
+    def _supervise(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            for worker in self._workers:
+                with self._lock:
+                    if self._stop.is_set() or worker.restarting or worker.healthy():
+                        continue
+                    worker.restarting = True
+                print(f"Процесс-обработчик {worker.index} не отвечает, перезапуск")
+                try:
+                    self._replace(worker)
+                finally:
+                    with self._lock:
+                        worker.restarting = False
+
+    def restart(self, timeout: Optional[float] = 60) -> None:
+        """Плавно перезапускает процессы по одному, например после обновления кода"""
+        for worker in self._workers:
+            with self._lock:
+                worker.restarting = True
+            try:
+                if not worker.stop(timeout):
+                    self._replace(worker)
+                else:
+                    with self._lock:
+                        if not self._stop.is_set():
+                            worker.start()
+            finally:
+                with self._lock:
+                    worker.restarting = False
+        print("Процессы-обработчики перезапущены")
+
+    def close(self, timeout: Optional[float] = 30) -> None:
+        """Дожидается обработки очередей и останавливает процессы"""
+        self._stop.set()
+        with self._lock:
+            for worker in self._workers:
+                worker.updates.put(None)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for worker in self._workers:
+                worker.process.join(None if deadline is None else max(0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.kill()
+
+def poll_updates(dispatcher: Dispatcher, stop: Event, skip_pending: bool = True) -> None:
+    """Получает обновления long polling и передает их диспетчеру, пока не установлен stop"""
+    token = settings.TELEGRAM_TOKEN
+    apihelper.delete_webhook(token)
+    offset = None
+    if skip_pending:
+        pending = apihelper.get_updates(token, offset=-1)
+        offset = pending[-1]['update_id'] + 1 if pending else None
+
+    while not stop.is_set():
+        try:
+            updates = apihelper.get_updates(token, offset=offset, limit=100, timeout=20, long_polling_timeout=20)
+        except Exception as e:
+            print(f"Не удалось получить обновления: {e}")
+            stop.wait(3)
+            continue
+        for update in updates:
+            if stop.is_set():
+                # Необработанные обновления Telegram пришлет снова при следующем запуске
+                return
+            dispatcher.route(update)
+            offset = update['update_id'] + 1
+
+def serve_webhook(dispatcher: Dispatcher) -> ThreadingHTTPServer:
+    """Принимает обновления вебхука на WEBHOOK_HOST:WEBHOOK_PORT в фоновом потоке"""
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != settings.WEBHOOK_PATH:
+                self.send_error(404)
+                return
+            if settings.WEBHOOK_SECRET and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != settings.WEBHOOK_SECRET:
+                self.send_error(403)
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            dispatcher.route(json.loads(body))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((settings.WEBHOOK_HOST, settings.WEBHOOK_PORT), WebhookHandler)
+    Thread(target=server.serve_forever, name="dispatcher-webhook", daemon=True).start()
+    if settings.WEBHOOK_URL:
+        apihelper.set_webhook(settings.TELEGRAM_TOKEN, settings.WEBHOOK_URL, secret_token=settings.WEBHOOK_SECRET or None)
+    return server
+
+def run_dispatcher() -> None:
+    """Запускает диспетчер и работает до SIGINT или SIGTERM, SIGHUP плавно перезапускает процессы"""
+    if settings.TG_API_URL:
+        apihelper.API_URL = settings.TG_API_URL
+
+    dispatcher = Dispatcher(settings.DISPATCH_WORKERS, settings.DISPATCH_THREADS)
+    dispatcher.start()
+    stop = Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: Thread(target=dispatcher.restart, daemon=True).start())
+
+    print(f"Бот запущен! Процессов-обработчиков: {settings.DISPATCH_WORKERS}")
+    if settings.BOT_MODE == "webhook":
+        server = serve_webhook(dispatcher)
+        while not stop.wait(1):
+            pass
+        server.shutdown()
+    else:
+        poller = Thread(target=poll_updates, args=(dispatcher, stop), name="dispatcher-polling", daemon=True)
+        poller.start()
+        while not stop.wait(1):
+            pass
+
+    dispatcher.close()
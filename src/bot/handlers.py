@@ -1,56 +1,68 @@
-import re
+import io
 import textwrap
 import random
-from telebot import types
-from src.bot.core import bot, MyStates, Command
-from src.bot.queries import get_or_create_user, add_user_word, delete_user_word, get_random_words, get_user_words
+from typing import Optional
+from telebot import TeleBot, types
+from src.bot.outbox import Outbox
+from src.bot.states import Command, MyStates
+from src.bot.queries import get_or_create_user, add_user_word, delete_user_word, next_card, count_user_words, get_words_by_ids, record_answer, skip_word, log_answer, get_user_stats, import_user_words
+from src.bot.session import CardSession, find_option, render_markup
+from src.config import settings
+from src.database.validation import MAX_WORD_LENGTH, is_eng_word, is_rus_word
+from src.metrics import timed
+
+# Бот и очередь отправки, с которыми работают обработчики, задаются в register_handlers
+bot: Optional[TeleBot] = None
+outbox: Optional[Outbox] = None
 
 def create_cards(message, user_id, previous_word = ""):
     """Выводим слово для конкретного клиента"""
-    markup = types.ReplyKeyboardMarkup(row_width=2)
-    # Получаем случайное слово
-    words = get_random_words(user_id, previous_word)
+    # Получаем слово для повторения и варианты ответа
+    card_words = next_card(user_id, previous_word)
 
-    if not words:
+    if not card_words:
+        markup = types.ReplyKeyboardMarkup(row_width=2)
         add_word_btn = types.KeyboardButton(Command.ADD_WORD)
         markup.add(add_word_btn)
-        bot.send_message(message.chat.id, "Слова не найдены, попробуйте добавить слово", reply_markup=markup)
+        outbox.send(message.chat.id, "Слова не найдены, попробуйте добавить слово", reply_markup=markup)
         return False
     
     # Устанавливаем состояние
     bot.set_state(message.from_user.id, MyStates.target_word, message.chat.id)
     
-    # Формируем кнопки из вариантов ответа
-    current_word = random.choice(words)
-    answer_options = [word['eng'] for word in words]    
-    answer_buttons = [types.KeyboardButton(str(word_text)) for word_text in answer_options]
-    random.shuffle(answer_buttons)
-    
-    # Формируем кнопки действий
-    add_word_btn = types.KeyboardButton(Command.ADD_WORD)
-    delete_btn = types.KeyboardButton(Command.DELETE_WORD)
-    next_btn = types.KeyboardButton(Command.NEXT)
-    answer_buttons.extend([next_btn, add_word_btn, delete_btn])
+    # Варианты ответа в случайном порядке, в состоянии храним только их id
+    current_word, words = card_words
+    random.shuffle(words)
+    card = CardSession(current_word['id'], tuple(word['id'] for word in words))
     
     # Сохраняем данные в состоянии для использования в обработчике
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
-        data['buttons'] = answer_buttons
+        data['card'] = card.dump()
         data['user_id'] = user_id
-        data['current_word'] = current_word
-    
-    markup.add(*answer_buttons)
     
-    bot.send_message(message.chat.id, f"Выбери перевод слова:\n🇷🇺 {current_word['rus']}", reply_markup=markup)
+    markup = render_markup(card, {word['id']: word for word in words})
+    outbox.send(message.chat.id, f"Выбери перевод слова:\n🇷🇺 {current_word['rus']}", reply_markup=markup)
+
+def load_card(user_id, card_data):
+    """Восстанавливает карточку из состояния и слова ее вариантов ответа"""
+    card = CardSession.load(card_data)
+    if not user_id or card is None:
+        return None, None
 
+    words = get_words_by_ids(user_id, list(card.option_ids))
+    if words is None:
+        return None, None
+    return card, words
 
-@bot.message_handler(commands=['cards', 'start'])
+
+@timed("handler")
 def start(message):
     """Обработчик команд /start и /cards для начала работы с ботом."""
     # Создаем нового пользователя или находит существующего
     user_id, user_was_exist = get_or_create_user(message.from_user.id, message.from_user.username)
 
     if user_id is None:
-        bot.send_message(message.chat.id, "Произошла ошибка, попробуйте позже")
+        outbox.send(message.chat.id, "Произошла ошибка, попробуйте позже")
         return
 
     if user_was_exist:
@@ -63,82 +75,145 @@ def start(message):
             "   удалить слово 🔙.\n"
             "Ну что, начнём ⬇️")
     
-    bot.send_message(message.chat.id, text)
+    outbox.send(message.chat.id, text)
     create_cards(message, user_id)
 
-@bot.message_handler(func=lambda message: message.text == Command.NEXT)
-@bot.message_handler(func=lambda message: message.text == Command.CANCEL)
+@timed("handler")
 def next_cards(message):
     """Обработчик команд "Далее" и "Отмена" """
     # Получаем данные пользователя из временного хранилища
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
         user_id = data.get('user_id', False)
-        previous_word = data.get('current_word', False)
+        card_data = data.get('card')
+    card, words = load_card(user_id, card_data)
     
     if not user_id:
-        bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
         return
     
-    if not previous_word:
-        bot.send_message(message.chat.id, "Что то пошло не так! Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+    if not card:
+        outbox.send(message.chat.id, "Что то пошло не так! Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
         return
     
-    create_cards(message, user_id, previous_word['rus'])
+    if message.text == Command.NEXT:
+        # Без записи в расписании пропущенное слово сразу выпало бы снова.
+        # Если перед пропуском была ошибка, слово повторяется как забытое
+        if card.wrong_mask:
+            record_answer(user_id, card.word_id, False)
+        else:
+            skip_word(user_id, card.word_id)
+
+    create_cards(message, user_id, words[card.word_id]['rus'])
 
-@bot.message_handler(func=lambda message: message.text == Command.DELETE_WORD)
+@timed("handler")
 def delete_word(message):
     """Обработчик команды удаления слова из коллекции пользователя"""
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
         user_id = data.get('user_id', False)
-        current_word = data.get('current_word', False)
+        card_data = data.get('card')
+    card, words = load_card(user_id, card_data)
     
     if not user_id:
-        bot.send_message(message.chat.id, "Пропишите /start для начала работы:", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send(message.chat.id, "Пропишите /start для начала работы:", reply_markup=types.ReplyKeyboardRemove())
         return
     
-    if not current_word:
-        bot.send_message(message.chat.id, "Не удалось определить слово для удаления")
+    if not card:
+        outbox.send(message.chat.id, "Не удалось определить слово для удаления")
         create_cards(message, user_id)
         return
         
+    current_word = words[card.word_id]
     success = delete_user_word(user_id, current_word)
     if success:
         response_text = f"Слово \"{current_word.get('rus', '')}\" удалено!"
     else:
         response_text = f"Слово \"{current_word.get('rus', '')}\" является базовым. Его нельзя удалить!"
 
-    bot.send_message(message.chat.id, response_text)
+    outbox.send(message.chat.id, response_text)
     create_cards(message, user_id, current_word.get('rus'))
         
-@bot.message_handler(func=lambda message: message.text == Command.ADD_WORD)
+@timed("handler")
 def add_word(message):
     """Обработчик команды добавления нового слова в коллекцию пользователя."""
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
         user_id = data.get('user_id', False)
     
     if not user_id:
-        bot.send_message(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
         return
     
     # Добавляем кнопку отмена
     markup = types.ReplyKeyboardMarkup(row_width=2)
     markup.add(types.KeyboardButton(Command.CANCEL))
     
-    bot.send_message(message.chat.id, "Напишите какое слово хотите добавить:", reply_markup=markup)
+    outbox.send(message.chat.id, "Напишите какое слово хотите добавить:", reply_markup=markup)
     # Ждем слова на русском
     bot.set_state(message.from_user.id, MyStates.wait_word, message.chat.id)
+
+@timed("handler")
+def import_words_command(message):
+    """Обработчик команды массовой загрузки слов из файла"""
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+
+    if not user_id:
+        outbox.send(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    markup = types.ReplyKeyboardMarkup(row_width=2)
+    markup.add(types.KeyboardButton(Command.CANCEL))
+
+    outbox.send(message.chat.id, "Отправьте файл CSV с колонками rus, eng или JSON со словами", reply_markup=markup)
+    bot.set_state(message.from_user.id, MyStates.wait_import, message.chat.id)
+
+@timed("handler")
+def handle_import_file(message):
+    """Обработчик файла со словами"""
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id')
+
+    file_name = (message.document.file_name or "").lower()
+    fmt = "json" if file_name.endswith((".json", ".jsonl")) else "csv"
+    if (message.document.file_size or 0) > settings.IMPORT_MAX_FILE_SIZE:
+        outbox.send(message.chat.id, f"Файл больше {settings.IMPORT_MAX_FILE_SIZE // 1024} КБ, загрузите его частями")
+        return
+
+    content = bot.download_file(bot.get_file(message.document.file_id).file_path)
+
+    try:
+        result = import_user_words(user_id, io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", newline=""), fmt)
+    except (ValueError, KeyError, TypeError):
+        outbox.send(message.chat.id, "Не удалось прочитать файл, проверьте его формат")
+        return
+
+    if result is None:
+        outbox.send(message.chat.id, "Произошла ошибка, попробуйте позже")
+        return
+
+    text = f"Добавлено слов: {result.linked}, пропущено: {result.skipped}"
+    if result.invalid:
+        text += f"\nНе подошли по формату: {result.invalid} (одно слово, русское и английское, до {MAX_WORD_LENGTH} символов)"
+    if result.truncated:
+        text += f"\nЗагружены только первые {settings.IMPORT_MAX_WORDS} строк файла"
+    outbox.send(message.chat.id, text)
+    create_cards(message, user_id)
             
-@bot.message_handler(state=MyStates.wait_translate)
+@timed("handler")
 def handle_wait_translate(message):
     """Обработчик ввода перевода на английском"""
     word_translation = message.text 
     if len(word_translation.split()) != 1:
-        bot.send_message(message.chat.id, f"Укажите одно слово")
+        outbox.send(message.chat.id, f"Укажите одно слово")
         bot.set_state(message.from_user.id, MyStates.wait_translate, message.chat.id)
         return
 
-    if not re.match(r'^[A-Za-z\-]+$', word_translation):
-        bot.send_message(message.chat.id, f"Укажите слово на английском")
+    if len(word_translation) > MAX_WORD_LENGTH:
+        outbox.send(message.chat.id, f"Слово должно быть не длиннее {MAX_WORD_LENGTH} символов")
+        bot.set_state(message.from_user.id, MyStates.wait_translate, message.chat.id)
+        return
+
+    if not is_eng_word(word_translation):
+        outbox.send(message.chat.id, f"Укажите слово на английском")
         bot.set_state(message.from_user.id, MyStates.wait_translate, message.chat.id)
         return
     
@@ -151,25 +226,30 @@ def handle_wait_translate(message):
     word_translation = word_translation.capitalize() if word_translation else ""
     
     user_word_success, user_word_message = add_user_word(user_id, new_rus_word, word_translation)
-    bot.send_message(message.chat.id, user_word_message)
+    outbox.send(message.chat.id, user_word_message)
     if user_word_success:
-        user_words = get_user_words(user_id)
-        if user_words:
-            count_words_text = f"Сейчас вы изучаете {len(user_words)} слов"
-            bot.send_message(message.chat.id, count_words_text)
+        count_words = count_user_words(user_id)
+        if count_words:
+            count_words_text = f"Сейчас вы изучаете {count_words} слов"
+            outbox.send(message.chat.id, count_words_text)
     create_cards(message, user_id, new_rus_word)
 
-@bot.message_handler(state=MyStates.wait_word)
+@timed("handler")
 def handle_wait_word(message):
     """Обработчик ввода слова на русском"""
     word = message.text.strip() 
     if len(word.split()) != 1:
-        bot.send_message(message.chat.id, f"Укажите одно слово")
+        outbox.send(message.chat.id, f"Укажите одно слово")
+        bot.set_state(message.from_user.id, MyStates.wait_word, message.chat.id)
+        return
+
+    if len(word) > MAX_WORD_LENGTH:
+        outbox.send(message.chat.id, f"Слово должно быть не длиннее {MAX_WORD_LENGTH} символов")
         bot.set_state(message.from_user.id, MyStates.wait_word, message.chat.id)
         return
 
-    if not re.match(r'^[а-яА-ЯёЁ\-]+$', word):
-        bot.send_message(message.chat.id, f"Укажите слово на русском")
+    if not is_rus_word(word):
+        outbox.send(message.chat.id, f"Укажите слово на русском")
         bot.set_state(message.from_user.id, MyStates.wait_word, message.chat.id)
         return
 
@@ -179,49 +259,88 @@ def handle_wait_word(message):
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
         data['new_rus_word'] = word
 
-    bot.send_message(message.chat.id, f"Укажите перевод слова {word}")
+    outbox.send(message.chat.id, f"Укажите перевод слова {word}")
     bot.set_state(message.from_user.id, MyStates.wait_translate, message.chat.id)
 
-@bot.message_handler(func=lambda message: True)
+@timed("handler")
+def stats(message):
+    """Обработчик команды /stats: счетчики ответов пользователя"""
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        user_id = data.get('user_id', False)
+
+    if not user_id:
+        outbox.send(message.chat.id, "Пропишите /start для начала работы", reply_markup=types.ReplyKeyboardRemove())
+        return
+
+    user_stats = get_user_stats(user_id)
+    if user_stats is None:
+        outbox.send(message.chat.id, "Произошла ошибка, попробуйте позже")
+        return
+
+    answers, correct = user_stats['answers'], user_stats['correct']
+    accuracy = round(100 * correct / answers) if answers else 0
+    text = f"📊 Статистика\nОтветов: {answers}\nВерных: {correct} ({accuracy}%)"
+    words_count = count_user_words(user_id)
+    if words_count is not None:
+        text += f"\nСлов в словаре: {words_count}"
+    outbox.send(message.chat.id, text)
+
+@timed("handler")
 def message_reply(message):    
     """Обработчик основного взаимодействия с пользователем"""
     with bot.retrieve_data(message.from_user.id, message.chat.id) as data:  
         user_id = data.get('user_id', False)
-        current_word = data.get('current_word', [])
-        buttons = data.get('buttons', [])
+        card_data = data.get('card')
+    card, words = load_card(user_id, card_data)
         
     if not user_id:
-        bot.send_message(message.chat.id, "Для начала работы бота напишите /start", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send(message.chat.id, "Для начала работы бота напишите /start", reply_markup=types.ReplyKeyboardRemove())
         return 
     
-    if not current_word:
-        bot.send_message(message.chat.id, "Сессия завершена. Начните заново /start")
+    if not card:
+        outbox.send(message.chat.id, "Сессия завершена. Начните заново /start")
         bot.delete_state(message.from_user.id, message.chat.id)
         return
     
     text = message.text.replace('❌', '').strip()
+    current_word = words[card.word_id]
     
     if text.lower() == current_word['eng'].lower():
         hint = f"Верный ответ!\n {current_word['rus']} -> {current_word['eng']}"
-        bot.send_message(message.chat.id, hint, reply_markup=types.ReplyKeyboardRemove())
+        outbox.send(message.chat.id, hint, reply_markup=types.ReplyKeyboardRemove())
         bot.delete_state(message.from_user.id, message.chat.id)    
+        log_answer(user_id, card.word_id, True)
+        # Слово считается выученным в этот раз, только если не было ошибок
+        record_answer(user_id, card.word_id, card.wrong_mask == 0)
 
         create_cards(message, user_id, current_word['rus'])
     else:
-        updated_buttons = []
-        for btn in buttons:
-            btn_text = btn.text
-            clean_text = btn_text
-            if btn_text.lower() == text.lower():
-                updated_buttons.append(types.KeyboardButton(clean_text + ' ❌'))
-            else:
-                updated_buttons.append(types.KeyboardButton(clean_text))
+        log_answer(user_id, card.word_id, False)
+        option_index = find_option(card, words, text)
+        if option_index is not None:
+            card.mark_wrong(option_index)
             
         with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
-            data['buttons'] = updated_buttons
+            data['card'] = card.dump()
             
-        markup = types.ReplyKeyboardMarkup(row_width=2)
-        markup.add(*updated_buttons)
+        markup = render_markup(card, words)
 
         hint = f"Допущена ошибка!\n Попробуй ещё раз вспомнить слово 🇷🇺{current_word['rus']}"
-        bot.send_message(message.chat.id, hint, reply_markup=markup)
\ No newline at end of file
+        outbox.send(message.chat.id, hint, reply_markup=markup)
+
+def register_handlers(telegram_bot: TeleBot, message_outbox: Outbox) -> None:
+    """Регистрирует обработчики в боте, ответы отправляются через message_outbox"""
+    global bot, outbox
+    bot, outbox = telegram_bot, message_outbox
+
+    bot.register_message_handler(start, commands=['cards', 'start'])
+    bot.register_message_handler(next_cards, func=lambda message: message.text == Command.NEXT)
+    bot.register_message_handler(next_cards, func=lambda message: message.text == Command.CANCEL)
+    bot.register_message_handler(delete_word, func=lambda message: message.text == Command.DELETE_WORD)
+    bot.register_message_handler(add_word, func=lambda message: message.text == Command.ADD_WORD)
+    bot.register_message_handler(import_words_command, commands=['import'])
+    bot.register_message_handler(stats, commands=['stats'])
+    bot.register_message_handler(handle_import_file, content_types=['document'], state=MyStates.wait_import)
+    bot.register_message_handler(handle_wait_translate, state=MyStates.wait_translate)
+    bot.register_message_handler(handle_wait_word, state=MyStates.wait_word)
+    bot.register_message_handler(message_reply, func=lambda message: True)
@@ -0,0 +1,188 @@
+import atexit
+import time
+from collections import OrderedDict, deque
+from threading import Condition, Thread
+from typing import Optional
+from telebot import TeleBot, types
+from telebot.apihelper import ApiTelegramException
+from src.metrics import registry
+
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, не больше burst подряд"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен, 0 - доступен сейчас"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Запрещает отправку на указанное время, например после ответа 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.blocked_until
+
+class Outbox:
+    """Очередь исходящих сообщений с учетом лимитов Telegram
+
+    Обработчики ставят сообщения в очередь и сразу возвращаются, а отправкой
+    занимаются фоновые потоки. Соблюдаются общий лимит бота и лимит на чат,
+    ответы 429 повторяются после retry_after. Несколько сообщений подряд
+    в один чат объединяются в одно, если у всех кроме последнего нет своей клавиатуры.
+    Сообщения одного чата отправляются строго по порядку.
+
+    Args:
+        bot (TeleBot): Бот, через которого отправляются сообщения
+        workers (int): Количество потоков отправки, 0 - отправлять синхронно без очереди
+        global_rate (float): Сообщений в секунду для всего бота
+        chat_rate (float): Сообщений в секунду для одного чата
+        chat_burst (int): Сколько сообщений подряд можно отправить в один чат
+        max_retries (int): Сколько раз повторять отправку после 429
+    """
+
+    def __init__(self, bot: TeleBot, workers: int = 4, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: int = 3, max_retries: int = 5):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int, TokenBucket] = {}
+        # chat_id -> очередь (текст, клавиатура, попытка); порядок ключей задает очередность чатов
+        self._queues: OrderedDict[int, deque] = OrderedDict()
+        self._in_flight: set[int] = set()
+        self._cond = Condition()
+        self._closed = False
+        self._workers = [Thread(target=self._work, name=f"outbox-{i}", daemon=True) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def send(self, chat_id: int, text: str, reply_markup=None) -> None:
+        """Ставит сообщение в очередь на отправку"""
+        if not self._workers:
+            self._send(chat_id, text, reply_markup)
+            return
+
+        with self._cond:
+            self._queues.setdefault(chat_id, deque()).append((text, reply_markup, 0))
+            self._cond.notify()
+
+    def _send(self, chat_id: int, text: str, reply_markup) -> None:
+        """Отправляет сообщение, замеряя время запроса к Telegram"""
+        started = time.perf_counter()
+        try:
+            self.bot.send_message(chat_id, text, reply_markup=reply_markup)
+        except Exception:
+            registry.inc("bot_telegram_errors_total", method="sendMessage")
+            raise
+        finally:
+            registry.observe("bot_telegram_duration_seconds", time.perf_counter() - started, method="sendMessage")
+
+    def _coalesce(self, chat_id: int) -> tuple[str, object, int]:
+        """Забирает из очереди чата первое сообщение и присоединяет к нему следующие, если это возможно"""
+        queue = self._queues[chat_id]
+        text, markup, attempt = queue.popleft()
+        while queue and _replaceable(markup):
+            next_text, next_markup, _ = queue[0]
+            if len(text) + len(next_text) + 2 > MAX_MESSAGE_LENGTH:
+                break
+            queue.popleft()
+            text = f"{text}\n\n{next_text}"
+            markup = next_markup if next_markup is not None else markup
+
+        if queue:
+            self._queues.move_to_end(chat_id)
+        else:
+            del self._queues[chat_id]
+        return text, markup, attempt
+
+    def _next_message(self) -> Optional[tuple[int, tuple[str, object, int]]]:
+        """Ждет сообщение, которое можно отправить без нарушения лимитов"""
+        with self._cond:
+            while True:
+                if self._closed and not self._queues and not self._in_flight:
+                    return None
+
+                now = time.monotonic()
+                wait = self._global.delay(now) or None
+                if wait is None:
+                    for chat_id in self._queues:
+                        if chat_id in self._in_flight:
+                            continue
+                        bucket = self._chats.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+                        chat_wait = bucket.delay(now)
+                        if chat_wait == 0:
+                            bucket.take(now)
+                            self._global.take(now)
+                            self._in_flight.add(chat_id)
+                            return chat_id, self._coalesce(chat_id)
+                        wait = chat_wait if wait is None else min(wait, chat_wait)
+
+                self._cond.wait(wait)
+
+    def _done(self, chat_id: int, retry: Optional[tuple[str, object, int]] = None) -> None:
+        with self._cond:
+            self._in_flight.discard(chat_id)
+            if retry is not None:
+                self._queues.setdefault(chat_id, deque()).appendleft(retry)
+                self._queues.move_to_end(chat_id, last=False)
+            elif chat_id not in self._queues and self._chats[chat_id].idle(time.monotonic()):
+                del self._chats[chat_id]
+            self._cond.notify_all()
+
+    def _work(self) -> None:
+        while (item := self._next_message()) is not None:
+            chat_id, (text, markup, attempt) = item
+            retry = None
+            try:
+                self._send(chat_id, text, markup)
+            except ApiTelegramException as e:
+                if e.error_code == 429 and attempt < self.max_retries:
+                    retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after') or 2 ** attempt
+                    with self._cond:
+                        self._chats[chat_id].block(retry_after)
+                    retry = (text, markup, attempt + 1)
+                else:
+                    print(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+            except Exception as e:
+                print(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+            finally:
+                self._done(chat_id, retry)
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        """Дожидается отправки всех сообщений и останавливает потоки"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+def _replaceable(markup) -> bool:
+    """Можно ли присоединить к сообщению следующее: у него нет клавиатуры, которую нужно показать"""
+    return markup is None or isinstance(markup, types.ReplyKeyboardRemove)
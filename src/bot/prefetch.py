@@ -0,0 +1,104 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence
+from src.metrics import registry
+
+# Карточка: загаданное слово и варианты ответа, как возвращает get_card
+Card = tuple[Dict, List[Dict]]
+# fetch(previous_word, exclude_ids) -> карточка или None
+Fetch = Callable[[str, Sequence[int]], Optional[Card]]
+
+class _Ring:
+    __slots__ = ('cards', 'generation', 'pending')
+
+    def __init__(self):
+        # (русское слово карточки, после которой вытянута эта, карточка)
+        self.cards: deque[tuple[str, Card]] = deque()
+        self.generation = 0
+        self.pending = False
+
+class CardPrefetch:
+    """Заранее вытянутые карточки пользователей
+
+    Пока пользователь отвечает на карточку, в фоновых потоках для него готовятся
+    следующие depth карточек. Каждая следующая вытягивается с исключением слова
+    предыдущей, как при обычном выборе, и не повторяет уже вытянутые.
+    После добавления или удаления слов предвыборку нужно сбросить через invalidate.
+
+    Args:
+        depth (int): Сколько карточек держать наготове, 0 - предвыборка выключена
+        workers (int): Количество фоновых потоков
+        maxsize (int): Для скольких пользователей хранить карточки, давние вытесняются
+    """
+
+    def __init__(self, depth: int, workers: int = 2, maxsize: int = 10000):
+        self.depth = depth
+        self.maxsize = maxsize
+        self._rings: OrderedDict[int, _Ring] = OrderedDict()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="prefetch") if depth > 0 else None
+
+    def pop(self, user_id: int, previous_word: str) -> Optional[Card]:
+        """Забирает готовую карточку, если она вытянута после карточки со словом previous_word"""
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None or not ring.cards:
+                card = None
+            else:
+                after, card = ring.cards.popleft()
+                if card[0]['rus'] == previous_word or (previous_word and after != previous_word):
+                    # Пользователь ушел с той цепочки карточек, для которой они готовились
+                    ring.cards.clear()
+                    ring.generation += 1
+                    card = None
+
+        if self._executor is not None:
+            registry.inc("bot_prefetch_total", result="miss" if card is None else "hit")
+        return card
+
+    def refill(self, user_id: int, current: Dict, fetch: Fetch) -> None:
+        """Запускает пополнение карточек, которые последуют за показанным словом current"""
+        if self._executor is None:
+            return
+
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                ring = self._rings[user_id] = _Ring()
+                while len(self._rings) > self.maxsize:
+                    self._rings.popitem(last=False)
+            self._rings.move_to_end(user_id)
+            if ring.pending or len(ring.cards) >= self.depth:
+                return
+
+            ring.pending = True
+            last = ring.cards[-1][1][0] if ring.cards else current
+            exclude = [current['id']] + [card[0]['id'] for _, card in ring.cards]
+            self._executor.submit(self._fill, user_id, ring, ring.generation, last, exclude, fetch)
+
+    def _fill(self, user_id: int, ring: _Ring, generation: int, last: Dict, exclude: List[int], fetch: Fetch) -> None:
+        try:
+            while True:
+                card = fetch(last['rus'], exclude)
+                with self._lock:
+                    if card is None or ring.generation != generation or self._rings.get(user_id) is not ring:
+                        return
+                    ring.cards.append((last['rus'], card))
+                    if len(ring.cards) >= self.depth:
+                        return
+                last = card[0]
+                exclude.append(last['id'])
+        except Exception as e:
+            print(f"Не удалось подготовить карточку для пользователя {user_id}: {e}")
+        finally:
+            with self._lock:
+                ring.pending = False
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбрасывает готовые карточки пользователя, например после изменения его словаря"""
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is not None:
+                ring.cards.clear()
+                ring.generation += 1
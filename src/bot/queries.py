@@ -1,8 +1,37 @@
-from typing import Dict, List, Optional
-from sqlalchemy import delete, func, exc, or_, select
-from src.database.base import Session
-from src.database.models import User, UserWord, Word
+import bisect
+import random
+from functools import cache
+from datetime import datetime, timedelta, timezone
+from typing import IO, Dict, List, Optional, Sequence
+from sqlalchemy import delete, false, func, exc, literal, null, or_, select, union_all, update
+from sqlalchemy.dialects import postgresql
+from src.bot.cache import DeckCache
+from src.bot.prefetch import CardPrefetch
+from src.bot.snapshot import BaseDictionary, BaseDictionaryCache
+from src.config import settings
+from src.database.answer_log import AnswerLog
+from src.database.base import Session, seed_reviews
+from src.database.importer import ImportResult, import_words, read_words
+from src.database.models import Review, User, UserStats, UserWord, Word, WordDistractor
+from src.metrics import log_error, timed
 
+@cache
+def get_deck_cache() -> DeckCache:
+    return DeckCache(settings.DECK_CACHE_SIZE, settings.DECK_CACHE_TTL)
+
+@cache
+def get_base_dictionary_cache() -> BaseDictionaryCache:
+    return BaseDictionaryCache(settings.BASE_DICTIONARY_CHECK_INTERVAL)
+
+@cache
+def get_card_prefetch() -> CardPrefetch:
+    return CardPrefetch(settings.PREFETCH_DEPTH, settings.PREFETCH_WORKERS)
+
+@cache
+def get_answer_log() -> AnswerLog:
+    return AnswerLog(settings.ANSWER_LOG_BATCH, settings.ANSWER_LOG_INTERVAL)
+
+@timed("query")
 def get_user_words(user_id: int) -> Optional[list[tuple[str, str]]]:
     """Получает список слов пользователя в формате (русское, английское)
 
@@ -13,15 +42,110 @@ def get_user_words(user_id: int) -> Optional[list[tuple[str, str]]]:
         list[tuple[str, str]]: Список пар (русское слово, английское слово)
     """
     try:
+        base = get_base_dictionary_cache().get()
+        own = _get_own_words(user_id)
+        pairs = list(zip(base.rus, base.eng)) + [(word['rus'], word['eng']) for word in own]
+        return pairs or None
+        
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+def count_user_words(user_id: int) -> Optional[int]:
+    """Получает количество слов, которые видит пользователь
+
+    Базовые слова считаются по снимку словаря. Собственные слова пользователя
+    берутся из кэша, иначе считаются одним запросом по его связям.
+
+    Args:
+        user_id (int): ID пользователя
+
+    Returns:
+        int: Количество слов или None при ошибке
+    """
+    try:
+        base = get_base_dictionary_cache().get()
+        deck_cache = get_deck_cache()
+        own = deck_cache.get(user_id) if deck_cache.enabled else None
+        if own is not None:
+            return len(base) + len(own)
+
         with Session() as session:
-            stmt = (select(Word).join(UserWord, isouter=True).where(or_(UserWord.id_user == user_id, UserWord.id_user.is_(None))))
-            words = session.scalars(stmt).all()
-            
-        return [(word.rus, word.eng) for word in words] if words else None
+            return len(base) + session.scalar(_own_words_count(user_id))
+        
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+@timed("query")
+def get_words_by_ids(user_id: int, word_ids: List[int]) -> Optional[Dict[int, Dict]]:
+    """Получает слова по id: базовые из снимка словаря, остальные из кэша слов пользователя или базы
+
+    Args:
+        user_id (int): ID пользователя
+        word_ids (List[int]): Id нужных слов
+
+    Returns:
+        Dict[int, Dict]: Слова в виде словарей по id или None, если какого-то слова уже нет
+    """
+    try:
+        words, missing = _find_words(get_base_dictionary_cache().get(), get_deck_cache().get(user_id), word_ids)
+        if missing:
+            with Session() as session:
+                words.update((word.id, word.to_dict()) for word in session.scalars(select(Word).where(Word.id.in_(missing))))
+        return words if len(words) == len(set(word_ids)) else None
         
     except exc.SQLAlchemyError as e:
+        log_error(e)
         return None
 
+def _find_words(base: BaseDictionary, own: Optional[List[Dict]], word_ids: List[int]) -> tuple[Dict[int, Dict], List[int]]:
+    """Слова, найденные в снимке словаря и в словах пользователя, и id ненайденных"""
+    own_by_id = {word['id']: word for word in own} if own else {}
+    words, missing = {}, []
+    for word_id in set(word_ids):
+        word = base.find(word_id) or own_by_id.get(word_id)
+        if word is None:
+            missing.append(word_id)
+        else:
+            words[word_id] = word
+    return words, missing
+
+def _get_own_words(user_id: int) -> List[Dict]:
+    """Возвращает собственные слова пользователя из кэша, при промахе загружает их из базы
+
+    Args:
+        user_id (int): ID пользователя
+
+    Returns:
+        List[Dict]: Слова пользователя сверх базового словаря в виде словарей
+    """
+    deck_cache = get_deck_cache()
+    if deck_cache.enabled:
+        own = deck_cache.get(user_id)
+        if own is not None:
+            return own
+
+    with Session() as session:
+        own = [word.to_dict() for word in session.scalars(_own_words(user_id))]
+
+    deck_cache.put(user_id, own)
+    return own
+
+def _own_words(user_id: int):
+    """Запрос собственных слов пользователя по индексу (id_user, id_word)"""
+    return (select(Word)
+            .join(UserWord, UserWord.id_word == Word.id)
+            .where(UserWord.id_user == user_id, ~Word.is_main)
+            .order_by(Word.id))
+
+def _own_words_count(user_id: int):
+    return (select(func.count(UserWord.id))
+            .join(Word, Word.id == UserWord.id_word)
+            .where(UserWord.id_user == user_id, ~Word.is_main))
+
+@timed("query")
 def get_or_create_user(telegram_id: int, telegram_username: str) -> tuple[Optional[int], bool]:
     """Проверка на пользователя
 
@@ -43,14 +167,21 @@ def get_or_create_user(telegram_id: int, telegram_username: str) -> tuple[Option
             user = User(telegram_id = telegram_id, telegram_username = telegram_username)
             session.add(user)
             session.commit()
+            # После commit атрибуты истекают, читаем id пока сессия открыта
+            user_id = user.id
                         
-        return user.id, False
+        return user_id, False
     except exc.SQLAlchemyError as e:
+        log_error(e)
         return None, False
 
+@timed("query")
 def get_random_words(user_id: int, previous_word: str, limit: int = 4) -> Optional[List[Dict]]:
     """Получить рандомно определенное количество слов
 
+    Слова выбираются в памяти из снимка базового словаря и собственных слов пользователя,
+    поэтому обращение к базе нужно, только если собственных слов нет в кэше.
+
     Args:
         user_id (int): Id пользователя
         previous_word (str): Предыдущее слово для исключения
@@ -59,25 +190,315 @@ def get_random_words(user_id: int, previous_word: str, limit: int = 4) -> Option
         List[Dict]: Список слов в виде словарей
     """
     try:
+        return _sample_words(get_base_dictionary_cache().get(), _get_own_words(user_id), previous_word, limit) or None
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+def _sample_words(base: BaseDictionary, own: List[Dict], previous_word: str, limit: int) -> List[Dict]:
+    """Случайные слова из базового словаря и слов пользователя без слова previous_word
+
+    Позиции выбираются в памяти, поэтому стоимость не зависит ни от размера таблицы word,
+    ни от того, какая доля ее слов видна пользователю.
+    """
+    total = len(base) + len(own)
+    # С запасом на версии предыдущего слова, полный перебор - только если их оказалось слишком много
+    for size in (min(total, limit * 2), total):
+        words = []
+        for position in random.sample(range(total), size):
+            word = base.word(position) if position < len(base) else dict(own[position - len(base)])
+            if word['rus'] != previous_word:
+                words.append(word)
+                if len(words) >= limit:
+                    return words
+    return words
+
+def _visible_words(user_id: int):
+    """Условие видимости слова для пользователя: базовое слово или связанное с ним"""
+    return or_(Word.is_main, Word.userword.any(UserWord.id_user == user_id))
+
+# Через сколько повторить слово, на которое ответили с ошибкой
+_RELEARN_INTERVAL = timedelta(minutes=10)
+# На сколько откладывается слово, карточку с которым пропустили
+_SKIP_INTERVAL = timedelta(minutes=10)
+_MIN_EASE = 1.3
+# Сколько базовых слов после курсора проверять одним запросом и сколько таких порций за один выбор карточки
+_NEW_WORD_CHUNK = 64
+_NEW_WORD_CHUNKS = 4
+
+@timed("query")
+def get_card(user_id: int, previous_word: str, limit: int = 4,
+             exclude_ids: Sequence[int] = ()) -> Optional[tuple[Dict, List[Dict]]]:
+    """Выбирает слово для карточки по расписанию повторений и варианты ответа
+
+    Сначала берется слово с самым ранним наступившим сроком повторения,
+    затем еще не изученное базовое слово, а если таких нет - ближайшее по сроку.
+    Собственные слова пользователя стоят в расписании с момента добавления.
+    Остальные варианты ответа берутся из индекса похожих слов,
+    а если в нем не хватает видимых пользователю слов - добираются случайными.
+
+    Args:
+        user_id (int): Id пользователя
+        previous_word (str): Предыдущее слово для исключения
+        limit (int): Количество вариантов ответа вместе с правильным
+        exclude_ids (Sequence[int]): Id слов, которые нельзя загадывать, например уже вытянутых заранее
+
+    Returns:
+        tuple[Dict, List[Dict]]: Загаданное слово и все варианты ответа
+    """
+    try:
+        base = get_base_dictionary_cache().get()
         with Session() as session:
-            stmt = (select(Word)
-                    .join(UserWord, isouter=True)
-                    .where(Word.rus != previous_word,
-                        or_(UserWord.id_user == user_id, UserWord.id_user.is_(None)),)
-                    .order_by(func.random())
-                    .limit(limit))
-            
-            words = session.scalars(stmt).all()
-        return [word.to_dict() for word in words] if words else None
+            target_id = _pick_target_id(session, user_id, previous_word, base, exclude_ids)
+            # Сохраняет сдвиг курсора новых слов
+            session.commit()
+            target = session.get(Word, target_id) if target_id is not None else None
+            if target is None:
+                return None
+            target = target.to_dict()
+            similar = _similar_words(session, user_id, target_id, previous_word, limit)
+
+        options = _with_distractors(target, similar, limit)
+        if len(options) < limit:
+            # Индекс для нового слова еще не построен или в нем мало слов, видимых пользователю
+            options = _with_distractors(target, similar + (get_random_words(user_id, previous_word, limit * 2) or []), limit)
+        return target, options
     except exc.SQLAlchemyError as e:
+        log_error(e)
         return None
-    
+
+@timed("query")
+def next_card(user_id: int, previous_word: str, limit: int = 4) -> Optional[tuple[Dict, List[Dict]]]:
+    """Карточка для показа: заранее вытянутая, а если ее нет - через get_card
+
+    После выдачи в фоне готовятся следующие карточки (настройка PREFETCH_DEPTH).
+
+    Args:
+        user_id (int): Id пользователя
+        previous_word (str): Предыдущее слово для исключения
+        limit (int): Количество вариантов ответа вместе с правильным
+
+    Returns:
+        tuple[Dict, List[Dict]]: Загаданное слово и все варианты ответа
+    """
+    card = get_card_prefetch().pop(user_id, previous_word)
+    if card is None:
+        card = get_card(user_id, previous_word, limit)
+    if card is not None:
+        get_card_prefetch().refill(user_id, card[0], lambda word, exclude_ids: get_card(user_id, word, limit, exclude_ids))
+    return card
+
+def _similar_words(session, user_id: int, word_id: int, previous_word: str, limit: int) -> List[Dict]:
+    """Видимые пользователю слова из индекса похожих слов, лучшие по рангу в случайном порядке"""
+    stmt = (select(Word)
+            .join(WordDistractor, WordDistractor.id_distractor == Word.id)
+            .where(WordDistractor.id_word == word_id, Word.rus != previous_word, _visible_words(user_id))
+            .order_by(WordDistractor.rank)
+            .limit((limit - 1) * 2))
+    words = [word.to_dict() for word in session.scalars(stmt)]
+    # Запас из лучших слов перемешивается, чтобы у карточки не было всегда одних и тех же вариантов
+    random.shuffle(words)
+    return words
+
+def _with_distractors(target: Dict, candidates: List[Dict], limit: int) -> List[Dict]:
+    """Составляет варианты ответа из загаданного слова и кандидатов
+
+    Кандидаты с уже занятым русским словом или переводом пропускаются,
+    иначе на карточке оказалось бы несколько верных ответов или одинаковые кнопки.
+    """
+    options = [target]
+    used_rus, used_eng = {target['rus']}, {target['eng'].lower()}
+    for word in candidates:
+        if len(options) >= limit:
+            break
+        if word['rus'] in used_rus or word['eng'].lower() in used_eng:
+            continue
+        options.append(word)
+        used_rus.add(word['rus'])
+        used_eng.add(word['eng'].lower())
+    return options
+
+def _pick_target_id(session, user_id: int, previous_word: str, base: BaseDictionary,
+                    exclude_ids: Sequence[int] = ()) -> Optional[int]:
+    """Находит id слова для повторения по индексу (id_user, due_at), новые слова - по курсору пользователя"""
+    excluded = [Word.id.not_in(exclude_ids)] if exclude_ids else []
+    due_stmt = (select(Review.id_word)
+                .join(Word, Word.id == Review.id_word)
+                .where(Review.id_user == user_id, Word.rus != previous_word, _visible_words(user_id), *excluded)
+                .order_by(Review.due_at)
+                .limit(1))
+
+    word_id = session.scalar(due_stmt.where(Review.due_at <= datetime.now(timezone.utc)))
+    if word_id is not None:
+        return word_id
+
+    word_id = _next_new_word(session, user_id, previous_word, base, exclude_ids)
+    if word_id is not None:
+        return word_id
+
+    return session.scalar(due_stmt)
+
+def _next_new_word(session, user_id: int, previous_word: str, base: BaseDictionary,
+                   exclude_ids: Sequence[int] = ()) -> Optional[int]:
+    """Следующее по id базовое слово без записи в расписании повторений пользователя
+
+    Слова после курсора new_word_cursor берутся из снимка словаря порциями, записи расписания
+    для порции проверяются одним запросом по индексу (id_user, id_word). Курсор сдвигается
+    за слова, которые уже стоят в расписании, поэтому повторно они не проверяются.
+    Просматривается не больше _NEW_WORD_CHUNKS порций, чтобы выбор карточки не зависел
+    от размера словаря, следующий выбор продолжит с нового курсора.
+
+    Returns:
+        Optional[int]: Id слова или None, если в просмотренных порциях новых слов нет
+    """
+    cursor = session.scalar(select(User.new_word_cursor).where(User.id == user_id)) or 0
+    excluded = set(exclude_ids)
+    position = bisect.bisect_right(base.ids, cursor)
+    # Курсор можно сдвинуть только за сплошной ряд слов в расписании
+    advanced, contiguous, word_id = cursor, True, None
+    for _ in range(_NEW_WORD_CHUNKS):
+        chunk = base.ids[position:position + _NEW_WORD_CHUNK].tolist()
+        if not chunk:
+            break
+        scheduled = set(session.scalars(
+            select(Review.id_word).where(Review.id_user == user_id, Review.id_word.in_(chunk))
+        ))
+        for offset, candidate in enumerate(chunk):
+            if candidate in scheduled:
+                if contiguous:
+                    advanced = candidate
+                continue
+            contiguous = False
+            if candidate not in excluded and base.rus[position + offset] != previous_word:
+                word_id = candidate
+                break
+        if word_id is not None:
+            break
+        position += len(chunk)
+
+    if advanced > cursor:
+        session.execute(update(User).where(User.id == user_id, User.new_word_cursor < advanced)
+                        .values(new_word_cursor=advanced))
+    return word_id
+
+@timed("query")
+def record_answer(user_id: int, word_id: int, correct: bool) -> bool:
+    """Обновляет расписание повторения слова по результату ответа
+
+    Упрощенный алгоритм SM-2: верный ответ увеличивает интервал в ease раз,
+    ошибка сбрасывает интервал и уменьшает ease.
+
+    Args:
+        user_id (int): Id пользователя
+        word_id (int): Id слова
+        correct (bool): Ответ дан без ошибок
+
+    Returns:
+        bool: True при успешной записи
+    """
+    try:
+        with Session() as session:
+            _record_answer(session, user_id, word_id, correct)
+            session.commit()
+        return True
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False
+
+@timed("query")
+def skip_word(user_id: int, word_id: int) -> bool:
+    """Откладывает слово пропущенной карточки на _SKIP_INTERVAL
+
+    Интервал и ease не меняются. Новое слово при этом получает запись в расписании,
+    поэтому следующий выбор карточки переходит к другим словам.
+
+    Args:
+        user_id (int): Id пользователя
+        word_id (int): Id слова
+
+    Returns:
+        bool: True при успешной записи
+    """
+    try:
+        with Session() as session:
+            _record_skip(session, user_id, word_id)
+            session.commit()
+        return True
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return False
+
+def log_answer(user_id: int, word_id: int, correct: bool) -> None:
+    """Записывает попытку ответа в журнал статистики, в базу она попадет с ближайшим пакетом"""
+    get_answer_log().record(user_id, word_id, correct)
+
+@timed("query")
+def get_user_stats(user_id: int) -> Optional[Dict]:
+    """Получает счетчики ответов пользователя
+
+    Читается одна строка UserStats, к ней прибавляются ответы, еще не записанные в базу.
+
+    Args:
+        user_id (int): ID пользователя
+
+    Returns:
+        dict: answers - всего ответов, correct - верных, None при ошибке
+    """
+    try:
+        with Session() as session:
+            row = session.execute(
+                select(UserStats.answers, UserStats.correct).where(UserStats.id_user == user_id)
+            ).first()
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
+
+    return _with_pending_answers(user_id, row)
+
+def _with_pending_answers(user_id: int, row) -> Dict:
+    answers, correct = get_answer_log().pending(user_id)
+    if row is not None:
+        answers, correct = answers + row.answers, correct + row.correct
+    return {'answers': answers, 'correct': correct}
+
+def _record_answer(session, user_id: int, word_id: int, correct: bool) -> None:
+    review = session.scalar(select(Review).where(Review.id_user == user_id, Review.id_word == word_id))
+    if review is None:
+        review = Review(id_user=user_id, id_word=word_id, interval=0, ease=2.5, repetitions=0)
+        session.add(review)
+
+    now = datetime.now(timezone.utc)
+    if correct:
+        review.repetitions += 1
+        if review.repetitions == 1:
+            review.interval = 1
+        elif review.repetitions == 2:
+            review.interval = 6
+        else:
+            review.interval = round(review.interval * review.ease, 1)
+        review.ease = review.ease + 0.1
+        review.due_at = now + timedelta(days=review.interval)
+    else:
+        review.repetitions = 0
+        review.interval = 0
+        review.ease = max(_MIN_EASE, review.ease - 0.2)
+        review.due_at = now + _RELEARN_INTERVAL
+
+def _record_skip(session, user_id: int, word_id: int) -> None:
+    until = datetime.now(timezone.utc) + _SKIP_INTERVAL
+    seed_reviews(session, user_id, [word_id], due_at=until)
+    # Слово с более поздним сроком пропуск не приближает
+    session.execute(update(Review)
+                    .where(Review.id_user == user_id, Review.id_word == word_id, Review.due_at < until)
+                    .values(due_at=until))
+
+@timed("query")
 def add_user_word(user_id: int, rus_word: str, eng_word: str) -> tuple[bool, str]:
     """Добавление слова в словарь пользователя
 
-    Если слово с русским переводом уже существует, проверяет английский перевод.
-    Если английский перевод отличается - создает новую версию слова.
-    Если перевод совпадает - добавляет связь с пользователем.
+    Если пары (русское, английское) еще нет, создается слово: первое с таким русским
+    словом или его новая версия со следующим номером. Существующая пара связывается
+    с пользователем, базовые слова и так видны всем и не связываются.
     
     Args:
         user_id (int): ID пользователя
@@ -89,40 +510,101 @@ def add_user_word(user_id: int, rus_word: str, eng_word: str) -> tuple[bool, str
     """
     try:
         with Session() as session:
-            # Ищем существующие слова с таким русским переводом
-            existing_words = session.query(Word).filter(Word.rus == rus_word).order_by(Word.number.desc()).all()
-
-            if not existing_words:
-                # Создаем новое слово
-                word = _create_new_word(session, rus_word, eng_word)
-                _create_user_word(session, user_id, word.id)
-                session.commit()
-                return True, "Слово успешно добавлено"
-            
-            # Проверяем существующие слова
-            for word in existing_words:
-                if eng_word != word.eng:
-                    # Перевод отличается - создаем новую версию
-                    word = _create_new_word(session, rus_word, eng_word, existing_words[0].number + 1)
-                    _create_user_word(session, user_id, word.id)
-                    session.commit()
-                    return True, "Создана новая версия слова"
-                
-                # Переводы совпадают - проверяем связь с пользователем
-                user_word_exists = session.query(UserWord).filter(UserWord.id_user == user_id, UserWord.id_word == word.id).first()
-                if not user_word_exists:
-                    # Создаем связь пользователь-слово
-                    _create_user_word(session, user_id, word.id)
-                    session.commit()
-                    return True, "Слово добавлено в словарь"
-            
-            return False, "Слово уже существует в вашем словаре"
+            number, linked = _add_user_word(session, user_id, rus_word, eng_word)
+            session.commit()
+        if number or linked:
+            get_deck_cache().invalidate(user_id)
+            get_card_prefetch().invalidate(user_id)
+        return _add_word_message(number, linked)
         
     except exc.SQLAlchemyError as e:
+        log_error(e)
         error_msg = f"Ошибка базы данных: {e}"
-        session.rollback()
         return False, error_msg
 
+def _add_word_message(number: Optional[int], linked: bool) -> tuple[bool, str]:
+    if number == 1:
+        return True, "Слово успешно добавлено"
+    if number:
+        return True, "Создана новая версия слова"
+    if linked:
+        return True, "Слово добавлено в словарь"
+    return False, "Слово уже существует в вашем словаре"
+
+def _add_user_word(session, user_id: int, rus_word: str, eng_word: str) -> tuple[Optional[int], bool]:
+    """Создает слово при необходимости и связывает его с пользователем
+
+    Returns:
+        tuple: (номер версии созданного слова или None, создана ли связь с пользователем)
+    """
+    if session.bind.dialect.name != "postgresql":
+        return _add_user_word_portable(session, user_id, rus_word, eng_word)
+
+    # Если параллельный запрос вставил ту же пару между снимком и вставкой,
+    # ON CONFLICT ничего не вернет, а повтор уже увидит готовое слово
+    for _ in range(2):
+        row = session.execute(_add_user_word_statement(user_id, rus_word, eng_word)).first()
+        if row is not None:
+            return row.number, row.linked
+    raise exc.InvalidRequestError(f"Не удалось добавить слово {rus_word} -> {eng_word}")
+
+def _add_user_word_statement(user_id: int, rus_word: str, eng_word: str):
+    """Один запрос Postgres: поиск пары, вставка новой версии и связи с пользователем через ON CONFLICT"""
+    existing = select(Word.id, Word.is_main).where(Word.rus == rus_word, Word.eng == eng_word).cte("existing")
+    next_number = select(func.coalesce(func.max(Word.number), 0) + 1).where(Word.rus == rus_word).scalar_subquery()
+    new_word = (
+        postgresql.insert(Word)
+        .from_select(
+            ["rus", "eng", "number", "is_main"],
+            select(literal(rus_word), literal(eng_word), next_number, false())
+            .where(~select(existing.c.id).exists()),
+        )
+        .on_conflict_do_nothing(index_elements=[Word.rus, Word.eng])
+        .returning(Word.id, Word.number)
+        .cte("new_word")
+    )
+    target = union_all(
+        select(existing.c.id, existing.c.is_main, null().label("number")),
+        select(new_word.c.id, false(), new_word.c.number),
+    ).cte("target")
+    link = (
+        postgresql.insert(UserWord)
+        .from_select(["id_user", "id_word"], select(literal(user_id), target.c.id).where(~target.c.is_main))
+        .on_conflict_do_nothing(index_elements=[UserWord.id_user, UserWord.id_word])
+        .returning(UserWord.id_word)
+        .cte("link")
+    )
+    # Новое собственное слово сразу ставится в расписание повторений, см. seed_reviews
+    review = (
+        postgresql.insert(Review)
+        .from_select(["id_user", "id_word", "interval", "ease", "repetitions", "due_at"],
+                     select(literal(user_id), link.c.id_word, literal(0.0), literal(2.5), literal(0), func.now()))
+        .on_conflict_do_nothing(index_elements=[Review.id_user, Review.id_word])
+        .returning(Review.id_word)
+        .cte("review")
+    )
+    # CTE попадает в запрос, только если на него есть ссылка
+    return select(target.c.number, select(link.c.id_word).exists().label("linked"),
+                  select(review.c.id_word).exists().label("scheduled"))
+
+def _add_user_word_portable(session, user_id: int, rus_word: str, eng_word: str) -> tuple[Optional[int], bool]:
+    """То же, что _add_user_word, несколькими запросами для баз без изменяющих CTE"""
+    word = session.execute(select(Word.id, Word.is_main).where(Word.rus == rus_word, Word.eng == eng_word)).first()
+    if word is None:
+        number = session.scalar(select(func.coalesce(func.max(Word.number), 0) + 1).where(Word.rus == rus_word))
+        new_word = _create_new_word(session, rus_word, eng_word, number)
+        _create_user_word(session, user_id, new_word.id)
+        seed_reviews(session, user_id, [new_word.id])
+        return number, True
+
+    if word.is_main:
+        return None, False
+    if session.scalar(select(UserWord.id).where(UserWord.id_user == user_id, UserWord.id_word == word.id)):
+        return None, False
+    _create_user_word(session, user_id, word.id)
+    seed_reviews(session, user_id, [word.id])
+    return None, True
+
 def _create_new_word(session, rus_word: str, eng_word: str, number: int = 1) -> Word:
     new_word = Word(rus=rus_word, eng=eng_word, number=number)
     session.add(new_word)
@@ -134,6 +616,7 @@ def _create_user_word(session, user_id: int, word_id: int) -> bool:
     session.add(new_user_word)
     return True
     
+@timed("query")
 def delete_user_word(user_id: int, word: dict) -> bool:
     """Удаление слова пользователя
     Args:
@@ -145,22 +628,42 @@ def delete_user_word(user_id: int, word: dict) -> bool:
     """
     try:
         with Session() as session:
-
-            stmt = select(UserWord).where(
-                UserWord.id_user == user_id,
-                UserWord.id_word == word['id']
-            )
-            user_word = session.scalar(stmt)
-            if user_word:
-                session.delete(user_word)
-                word_conn_count = session.scalar(select(func.count(UserWord.id)).where(UserWord.id_word == word['id']))
-                if word_conn_count == 0:
-                    session.execute(delete(Word).where(Word.id == word['id']))
-                
-                session.commit()
-                return True
-            else:
-                return False
+            # Слово без связей удалит фоновая очистка (src.database.cleanup),
+            # у базовых слов связей нет, поэтому они не удаляются
+            result = session.execute(delete(UserWord).where(UserWord.id_user == user_id, UserWord.id_word == word['id']))
+            if result.rowcount:
+                session.execute(delete(Review).where(Review.id_user == user_id, Review.id_word == word['id']))
+            session.commit()
+        if not result.rowcount:
+            return False
+        get_deck_cache().invalidate(user_id)
+        get_card_prefetch().invalidate(user_id)
+        return True
         
     except exc.SQLAlchemyError as e:
-        return False
\ No newline at end of file
+        log_error(e)
+        return False
+
+@timed("query")
+def import_user_words(user_id: int, stream: IO[str], fmt: str) -> Optional[ImportResult]:
+    """Массовое добавление слов из файла в словарь пользователя
+
+    Загружаются первые IMPORT_MAX_WORDS строк файла, большие словари загружаются
+    командой python -m src.database.importer.
+
+    Args:
+        user_id (int): ID пользователя
+        stream (IO[str]): Текстовый поток с содержимым файла
+        fmt (str): Формат файла: csv или json
+
+    Returns:
+        ImportResult: Итог загрузки или None при ошибке базы данных
+    """
+    try:
+        result = import_words(read_words(stream, fmt), user_id=user_id, max_rows=settings.IMPORT_MAX_WORDS)
+        get_deck_cache().invalidate(user_id)
+        get_card_prefetch().invalidate(user_id)
+        return result
+    except exc.SQLAlchemyError as e:
+        log_error(e)
+        return None
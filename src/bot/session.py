@@ -0,0 +1,69 @@
+from typing import Dict, Optional
+from telebot import types
+from src.bot.states import Command
+
+class CardSession:
+    """Компактное состояние карточки пользователя
+
+    Хранит только id загаданного слова, id вариантов ответа в порядке кнопок
+    и битовую маску неверных ответов. Тексты слов и клавиатура
+    восстанавливаются по id при необходимости.
+
+    Args:
+        word_id (int): Id загаданного слова
+        option_ids (tuple[int, ...]): Id вариантов ответа в порядке кнопок
+        wrong_mask (int): Бит i установлен, если вариант i уже выбирали неверно
+    """
+    __slots__ = ('word_id', 'option_ids', 'wrong_mask')
+
+    def __init__(self, word_id: int, option_ids: tuple[int, ...], wrong_mask: int = 0):
+        self.word_id = word_id
+        self.option_ids = option_ids
+        self.wrong_mask = wrong_mask
+
+    def mark_wrong(self, index: int) -> None:
+        self.wrong_mask |= 1 << index
+
+    def is_wrong(self, index: int) -> bool:
+        return bool(self.wrong_mask >> index & 1)
+
+    def dump(self) -> list:
+        """Сериализует состояние в список из чисел для хранилища состояний"""
+        return [self.word_id, list(self.option_ids), self.wrong_mask]
+
+    @classmethod
+    def load(cls, raw: Optional[list]) -> Optional["CardSession"]:
+        """Восстанавливает состояние из результата dump, None если состояния нет"""
+        if not raw:
+            return None
+        word_id, option_ids, wrong_mask = raw
+        return cls(word_id, tuple(option_ids), wrong_mask)
+
+def render_markup(card: CardSession, words: Dict[int, Dict]) -> types.ReplyKeyboardMarkup:
+    """Строит клавиатуру карточки: варианты ответа с отметками ошибок и кнопки действий
+
+    Args:
+        card (CardSession): Состояние карточки
+        words (Dict[int, Dict]): Слова по id, должны содержать все варианты ответа
+
+    Returns:
+        types.ReplyKeyboardMarkup: Клавиатура для отправки пользователю
+    """
+    answer_buttons = []
+    for index, word_id in enumerate(card.option_ids):
+        text = str(words[word_id]['eng'])
+        answer_buttons.append(types.KeyboardButton(text + ' ❌' if card.is_wrong(index) else text))
+
+    markup = types.ReplyKeyboardMarkup(row_width=2)
+    markup.add(*answer_buttons,
+               types.KeyboardButton(Command.NEXT),
+               types.KeyboardButton(Command.ADD_WORD),
+               types.KeyboardButton(Command.DELETE_WORD))
+    return markup
+
+def find_option(card: CardSession, words: Dict[int, Dict], text: str) -> Optional[int]:
+    """Возвращает индекс варианта ответа с указанным текстом или None"""
+    for index, word_id in enumerate(card.option_ids):
+        if words[word_id]['eng'].lower() == text.lower():
+            return index
+    return None
@@ -0,0 +1,102 @@
+import bisect
+import sys
+import time
+from array import array
+from threading import Lock
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select
+from src.database.base import Session
+from src.database.models import DictionaryVersion, Word
+
+class BaseDictionary:
+    """Неизменяемый снимок базового словаря, один на процесс
+
+    Id и номера версий хранятся в массивах по возрастанию id, строки интернированы,
+    поэтому снимок занимает немного памяти и не зависит от числа пользователей.
+    Словари слов создаются только при обращении.
+
+    Args:
+        version (int): Версия базового словаря, из которой построен снимок
+        rows (Iterable): Строки (id, rus, eng, number) по возрастанию id
+    """
+    __slots__ = ('version', 'ids', 'numbers', 'rus', 'eng')
+
+    def __init__(self, version: int, rows: Iterable):
+        self.version = version
+        self.ids = array('q')
+        self.numbers = array('i')
+        self.rus: list[str] = []
+        self.eng: list[str] = []
+        for word_id, rus, eng, number in rows:
+            self.ids.append(word_id)
+            self.numbers.append(number)
+            self.rus.append(sys.intern(rus))
+            self.eng.append(sys.intern(eng))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def word(self, position: int) -> Dict:
+        """Слово на позиции position в том же виде, что Word.to_dict"""
+        return {
+            'id': self.ids[position],
+            'rus': self.rus[position],
+            'eng': self.eng[position],
+            'number': self.numbers[position],
+            'is_main': True,
+        }
+
+    def find(self, word_id: int) -> Optional[Dict]:
+        """Базовое слово по id или None, если такого базового слова нет"""
+        position = bisect.bisect_left(self.ids, word_id)
+        if position < len(self.ids) and self.ids[position] == word_id:
+            return self.word(position)
+        return None
+
+class BaseDictionaryCache:
+    """Текущий снимок базового словаря процесса
+
+    Номер версии в таблице dictionary_version проверяется не чаще раза в check_interval секунд,
+    снимок перечитывается, только если номер изменился.
+
+    Args:
+        check_interval (float): Как часто сверять версию с базой, в секундах
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._snapshot: Optional[BaseDictionary] = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+
+    def peek(self) -> Optional[BaseDictionary]:
+        """Снимок без обращения к базе или None, если пора сверить версию"""
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+        return None
+
+    def get(self) -> BaseDictionary:
+        """Актуальный снимок, при необходимости сверяет версию и перечитывает словарь"""
+        snapshot = self.peek()
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            # Пока ждали блокировку, версию мог сверить другой поток
+            snapshot = self.peek()
+            if snapshot is not None:
+                return snapshot
+
+            with Session() as session:
+                version = session.scalar(select(DictionaryVersion.version)) or 0
+                if self._snapshot is None or self._snapshot.version != version:
+                    rows = session.execute(
+                        select(Word.id, Word.rus, Word.eng, Word.number).where(Word.is_main).order_by(Word.id)
+                    )
+                    self._snapshot = BaseDictionary(version, rows)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Сверить версию при следующем обращении, например после загрузки базовых слов в этом процессе"""
+        self._checked_at = 0.0
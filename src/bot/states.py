@@ -0,0 +1,13 @@
+from telebot.handler_backends import State, StatesGroup
+
+class Command:
+    ADD_WORD = 'Добавить слово ➕'
+    DELETE_WORD = 'Удалить слово🔙'
+    NEXT = 'Дальше ⏭'
+    CANCEL = 'Отмена ❌'
+
+class MyStates(StatesGroup):
+    target_word = State()
+    wait_word = State()
+    wait_translate = State()
+    wait_import = State()
@@ -0,0 +1,242 @@
+import atexit
+import json
+import time
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from typing import Dict, Optional, Union
+from sqlalchemy import Column, MetaData, String, Table, Text, create_engine, delete, event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from telebot.storage import StateMemoryStorage
+from telebot.storage.base_storage import StateDataContext, StateStorageBase
+from src.config import settings
+from src.metrics import instrument_engine, timed
+
+def _state_table(engine: Engine) -> Table:
+    # В Postgres таблица нежурналируемая: состояние карточек не стоит записи в WAL
+    prefixes = ['UNLOGGED'] if engine.dialect.name == 'postgresql' else []
+    return Table(
+        "bot_state", MetaData(),
+        Column("key", String, primary_key=True),
+        Column("state", String, nullable=True),
+        Column("data", Text, nullable=False),
+        prefixes=prefixes,
+    )
+
+class DatabaseStateStorage(StateStorageBase):
+    """Хранилище состояний TeleBot в базе данных
+
+    Состояния переживают перезапуск и доступны нескольким процессам бота.
+    Чтения идут через LRU-кэш в памяти процесса, записи копятся
+    и сбрасываются в базу одной транзакцией раз в flush_interval секунд.
+    Удаленные записи убираются из кэша после сброса в базу.
+
+    Кэш и отложенная запись не видят изменений других процессов, поэтому они корректны,
+    только пока все обновления пользователя обрабатывает один процесс: единственный
+    процесс бота или режим диспетчера, который распределяет пользователей по процессам.
+    Если обновления пользователя могут попасть в разные процессы, нужны cache_ttl=0
+    и flush_interval=0: тогда каждое чтение и каждая запись идут в базу.
+
+    Args:
+        engine (Engine): Движок SQLAlchemy (Postgres или SQLite)
+        flush_interval (float): Период сброса накопленных записей в секундах, 0 - записывать сразу
+        cache_ttl (float): Сколько секунд запись из кэша считается актуальной, 0 - всегда читать из базы
+        cache_size (int): Сколько записей держать в кэше, давние вытесняются
+    """
+
+    def __init__(self, engine: Engine, flush_interval: float = 0.2, cache_ttl: float = 60, cache_size: int = 10000,
+                 prefix: str = "telebot", separator: str = ":") -> None:
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.prefix = prefix
+        self.separator = separator
+        self.table = _state_table(engine)
+        self.table.metadata.create_all(engine)
+
+        # key -> (время загрузки, запись или None если записи нет), от давних к недавним
+        self._cache: OrderedDict[str, tuple[float, Optional[dict]]] = OrderedDict()
+        # key -> запись для сохранения или None для удаления
+        self._dirty: Dict[str, Optional[dict]] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = Thread(target=self._flush_loop, name="state-storage-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _key(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> str:
+        return self._get_key(chat_id, user_id, self.prefix, self.separator,
+                             business_connection_id, message_thread_id, bot_id)
+
+    @timed("state")
+    def _read(self, key: str) -> Optional[dict]:
+        """Возвращает запись из кэша, при промахе или устаревании читает ее из базы"""
+        with self._lock:
+            if key in self._dirty:
+                return self._dirty[key]
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] + self.cache_ttl > time.monotonic():
+                    self._cache.move_to_end(key)
+                    return cached[1]
+                del self._cache[key]
+
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table.c.state, self.table.c.data).where(self.table.c.key == key)).first()
+        record = {'state': row.state, 'data': json.loads(row.data)} if row else None
+
+        with self._lock:
+            # Пока шло чтение, запись могла измениться в этом процессе
+            if key in self._dirty:
+                return self._dirty[key]
+            self._remember(key, record)
+        return record
+
+    def _remember(self, key: str, record: Optional[dict]) -> None:
+        """Кладет запись в кэш, вытесняя самые давние сверх cache_size. Вызывается под self._lock"""
+        if self.cache_ttl <= 0 or self.cache_size <= 0:
+            return
+        self._cache[key] = (time.monotonic(), record)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @timed("state")
+    def _write(self, key: str, record: Optional[dict]) -> None:
+        with self._lock:
+            self._remember(key, record)
+            self._dirty[key] = record
+        if self._flusher is None:
+            self.flush()
+
+    def set_state(self, chat_id, user_id, state, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        if hasattr(state, "name"):
+            state = state.name
+
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        data = record['data'] if record else {}
+        self._write(key, {'state': state, 'data': data})
+        return True
+
+    def get_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> Optional[str]:
+        record = self._read(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record['state'] if record else None
+
+    def delete_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        if self._read(key) is None:
+            return False
+        self._write(key, None)
+        return True
+
+    def set_data(self, chat_id, user_id, key, value: Union[str, int, float, dict],
+                 business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        _key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(_key)
+        if record is None:
+            raise RuntimeError(f"DatabaseStateStorage: key {_key} does not exist.")
+        self._write(_key, {'state': record['state'], 'data': {**record['data'], key: value}})
+        return True
+
+    def get_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> dict:
+        record = self._read(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record['data'] if record else {}
+
+    def reset_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        if record is None:
+            return False
+        self._write(key, {'state': record['state'], 'data': {}})
+        return True
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return StateDataContext(self, chat_id=chat_id, user_id=user_id, business_connection_id=business_connection_id,
+                                message_thread_id=message_thread_id, bot_id=bot_id)
+
+    def save(self, chat_id, user_id, data: dict, business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        if record is None:
+            return False
+        self._write(key, {'state': record['state'], 'data': data})
+        return True
+
+    @timed("state")
+    def flush(self) -> None:
+        """Сохраняет накопленные изменения в базу одной транзакцией"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        upserts = [{'key': key, 'state': record['state'], 'data': json.dumps(record['data'])}
+                   for key, record in dirty.items() if record is not None]
+        deletes = [key for key, record in dirty.items() if record is None]
+
+        try:
+            with self.engine.begin() as conn:
+                if upserts:
+                    insert = postgresql.insert if self.engine.dialect.name == 'postgresql' else sqlite.insert
+                    stmt = insert(self.table)
+                    conn.execute(stmt.on_conflict_do_update(
+                        index_elements=[self.table.c.key],
+                        set_={'state': stmt.excluded.state, 'data': stmt.excluded.data},
+                    ), upserts)
+                if deletes:
+                    conn.execute(delete(self.table).where(self.table.c.key.in_(deletes)))
+        except Exception:
+            # Возвращаем изменения в очередь, если их не перекрыли более новые
+            with self._lock:
+                self._dirty = {**dirty, **self._dirty}
+            raise
+
+        with self._lock:
+            for key in deletes:
+                # Удаленная запись больше не нужна в кэше, если ее не создали заново после сброса
+                if key not in self._dirty and key in self._cache and self._cache[key][1] is None:
+                    del self._cache[key]
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Не удалось сохранить состояния: {e}")
+
+    def close(self) -> None:
+        """Останавливает фоновый сброс и сохраняет оставшиеся изменения"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def __str__(self) -> str:
+        return f"<DatabaseStateStorage: {self.engine.url}>"
+
+def create_state_storage() -> StateStorageBase:
+    """Создает хранилище состояний, выбранное в настройках STATE_STORAGE
+
+    memory - в памяти процесса, database - в основной базе,
+    sqlite - в локальном файле STATE_STORAGE_PATH.
+    """
+    if settings.STATE_STORAGE == "database":
+        from src.database.base import get_engine
+        return DatabaseStateStorage(get_engine(), settings.STATE_FLUSH_INTERVAL, settings.STATE_CACHE_TTL,
+                                    settings.STATE_CACHE_SIZE)
+
+    if settings.STATE_STORAGE == "sqlite":
+        from src.database.base import set_sqlite_pragmas
+        engine = create_engine(f"sqlite:///{settings.STATE_STORAGE_PATH}")
+        event.listen(engine, "connect", set_sqlite_pragmas)
+        instrument_engine(engine)
+        return DatabaseStateStorage(engine, settings.STATE_FLUSH_INTERVAL, settings.STATE_CACHE_TTL,
+                                    settings.STATE_CACHE_SIZE)
+
+    return StateMemoryStorage()
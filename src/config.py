@@ -1,21 +1,106 @@
+from functools import cache
+from typing import Optional
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.engine import make_url
 
 class Settings(BaseSettings):
-    DB_HOST: str
-    DB_PORT: int
-    DB_USER: str
-    DB_PASS: str
-    DB_NAME: str
     TG_TOKEN: str
+    # postgres - сервер из DB_HOST..DB_NAME, sqlite - локальный файл DB_PATH
+    DB_BACKEND: str = "postgres"
+    DB_HOST: str = "localhost"
+    DB_PORT: int = 5432
+    DB_USER: str = ""
+    DB_PASS: str = ""
+    DB_NAME: str = ""
+    DB_PATH: str = "bot.db"
+    DB_URL: str = ""
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT: int = 0
+    DB_PREPARE_THRESHOLD: Optional[int] = 1
+    IMPORT_MAX_WORDS: int = 1000
+    IMPORT_MAX_FILE_SIZE: int = 1048576
+    DECK_CACHE_SIZE: int = 1000
+    DECK_CACHE_TTL: int = 300
+    BOT_MODE: str = "polling"
+    WEBHOOK_HOST: str = "127.0.0.1"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_URL: str = ""
+    WEBHOOK_SECRET: str = ""
+    TG_API_URL: str = ""
+    STATE_STORAGE: str = "memory"
+    STATE_STORAGE_PATH: str = "state.db"
+    STATE_FLUSH_INTERVAL: float = 0.2
+    STATE_CACHE_TTL: float = 60
+    STATE_CACHE_SIZE: int = 10000
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_GLOBAL_RATE: float = 30
+    OUTBOX_CHAT_RATE: float = 1
+    OUTBOX_CHAT_BURST: int = 3
+    DISPATCH_WORKERS: int = 0
+    DISPATCH_THREADS: int = 4
+    DISPATCH_HEALTH_TIMEOUT: float = 30
+    BASE_DICTIONARY_CHECK_INTERVAL: float = 30
+    PREFETCH_DEPTH: int = 2
+    PREFETCH_WORKERS: int = 2
+    ANSWER_LOG_BATCH: int = 500
+    ANSWER_LOG_INTERVAL: float = 1.0
+    DISTRACTOR_INTERVAL: float = 60
+    DISTRACTOR_MAX_NEW_WORDS: int = 1000
+    ORPHAN_SWEEP_INTERVAL: float = 300
+    ORPHAN_SWEEP_BATCH: int = 1000
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 0
+
+    @field_validator("DB_PREPARE_THRESHOLD", mode="before")
+    @classmethod
+    def _empty_prepare_threshold(cls, value):
+        # Пустое значение DB_PREPARE_THRESHOLD= отключает подготовку запросов на сервере
+        return None if value == "" else value
 
     @property
     def TELEGRAM_TOKEN(self):
         return self.TG_TOKEN
 
+    @property
+    def DATABASE_URL(self):
+        """URL основной базы: DB_URL, если задан, иначе по DB_BACKEND"""
+        if self.DB_URL:
+            return self.DB_URL
+        if self.DB_BACKEND == "sqlite":
+            return f"sqlite:///{self.DB_PATH}"
+        return self.DATABASE_URL_psycopg
+
+    @property
+    def DATABASE_URL_async(self):
+        """URL той же базы, что DATABASE_URL, с асинхронным драйвером для режима вебхука"""
+        url = make_url(self.DATABASE_URL)
+        if url.get_backend_name() == "sqlite":
+            url = url.set(drivername="sqlite+aiosqlite")
+        elif url.get_backend_name() == "postgresql":
+            url = url.set(drivername="postgresql+psycopg")
+        return url.render_as_string(hide_password=False)
+
     @property
     def DATABASE_URL_psycopg(self):
         return f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
     model_config = SettingsConfigDict(env_file=".env")
 
-settings = Settings()
\ No newline at end of file
+@cache
+def get_settings() -> Settings:
+    """Настройки из окружения и .env, читаются при первом обращении"""
+    return Settings()
+
+class _LazySettings:
+    """Откладывает чтение настроек до первого обращения к ним, чтобы импорт модулей не требовал .env"""
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+settings = _LazySettings()
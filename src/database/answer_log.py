@@ -0,0 +1,139 @@
+"""Отложенная запись ответов пользователей
+
+Ответ на карточку не должен ждать записи в базу, поэтому события копятся в памяти
+и записываются пакетом, когда их набирается batch_size или проходит interval секунд.
+Вместе с пакетом событий в той же транзакции обновляются счетчики UserStats,
+поэтому статистика читается одной строкой без разбора журнала.
+"""
+import atexit
+from collections import defaultdict
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+from typing import List, NamedTuple, Sequence
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from src.database.base import Session
+from src.database.models import AnswerEvent, UserStats
+from src.metrics import registry, timed
+
+class Answer(NamedTuple):
+    id_user: int
+    id_word: int
+    correct: bool
+    answered_at: datetime
+
+# Строк в одном многострочном INSERT: по 4 параметра на строку, меньше ограничения старых SQLite в 999 параметров
+_INSERT_CHUNK = 200
+
+@timed("query")
+def write_answers(session, answers: Sequence[Answer]) -> None:
+    """Записывает пакет ответов и прибавляет их к счетчикам пользователей в текущей транзакции session"""
+    totals = defaultdict(lambda: {"answers": 0, "correct": 0, "last_answer_at": None})
+    for answer in answers:
+        total = totals[answer.id_user]
+        total["answers"] += 1
+        total["correct"] += answer.correct
+        if total["last_answer_at"] is None or answer.answered_at > total["last_answer_at"]:
+            total["last_answer_at"] = answer.answered_at
+    # Строки счетчиков обновляются в порядке id_user, чтобы параллельные процессы не взаимоблокировались
+    rows = [{"id_user": id_user, **totals[id_user]} for id_user in sorted(totals)]
+
+    # Список параметров в execute драйвер выполнил бы построчно (executemany),
+    # поэтому строки передаются в values: один INSERT ... VALUES на порцию
+    for start in range(0, len(answers), _INSERT_CHUNK):
+        chunk = answers[start:start + _INSERT_CHUNK]
+        session.execute(insert(AnswerEvent.__table__).values([answer._asdict() for answer in chunk]))
+
+    postgres = session.bind.dialect.name == "postgresql"
+    # В SQLite нет greatest, max с двумя аргументами там скалярная функция
+    latest = func.greatest if postgres else func.max
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        stmt = (postgresql.insert if postgres else sqlite.insert)(UserStats.__table__).values(rows[start:start + _INSERT_CHUNK])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[UserStats.id_user],
+            set_={
+                "answers": UserStats.answers + stmt.excluded.answers,
+                "correct": UserStats.correct + stmt.excluded.correct,
+                "last_answer_at": latest(UserStats.last_answer_at, stmt.excluded.last_answer_at),
+            },
+        ))
+
+class AnswerLog:
+    """Буфер ответов, который фоновый поток записывает пакетами через write_answers
+
+    Оставшиеся ответы записываются при close, он же вызывается при выходе из процесса.
+
+    Args:
+        batch_size (int): Размер пакета, 0 - записывать каждый ответ сразу
+        interval (float): Наибольшая задержка записи в секундах
+    """
+
+    def __init__(self, batch_size: int = 500, interval: float = 1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._answers: List[Answer] = []
+        # Пакет, который сейчас записывается, учитывается в pending
+        self._writing: List[Answer] = []
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._full = Event()
+        self._stop = Event()
+        self._thread = None
+        if batch_size > 0:
+            self._thread = Thread(target=self._loop, name="answer-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, user_id: int, word_id: int, correct: bool) -> None:
+        """Добавляет ответ в буфер, не обращаясь к базе"""
+        answer = Answer(user_id, word_id, correct, datetime.now(timezone.utc))
+        with self._lock:
+            self._answers.append(answer)
+            size = len(self._answers)
+        if self._thread is None or self._stop.is_set():
+            self.flush()
+        elif size >= self.batch_size:
+            self._full.set()
+
+    def pending(self, user_id: int) -> tuple[int, int]:
+        """Ответы пользователя, еще не попавшие в UserStats: (всего, верных)"""
+        with self._lock:
+            answers = [answer for answer in self._writing + self._answers if answer.id_user == user_id]
+        return len(answers), sum(answer.correct for answer in answers)
+
+    def flush(self) -> int:
+        """Записывает все накопленные ответы, возвращает их количество"""
+        with self._write_lock:
+            with self._lock:
+                self._writing, self._answers = self._answers, []
+            answers = self._writing
+            if not answers:
+                return 0
+            try:
+                with Session() as session:
+                    write_answers(session, answers)
+                    session.commit()
+                # Пакет уже в UserStats, pending больше его не учитывает. Блокировка не держится
+                # на время commit: record в обработчике ответа ждал бы записи в базу
+                with self._lock:
+                    self._writing = []
+            except Exception as e:
+                # Журнал нужен только для статистики, поэтому пакет не повторяется, чтобы не копить его бесконечно
+                registry.inc("bot_answer_log_dropped_total", len(answers))
+                print(f"Не удалось записать ответы пользователей ({len(answers)}): {e}")
+                with self._lock:
+                    self._writing = []
+            return len(answers)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._full.wait(self.interval)
+            self._full.clear()
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._full.set()
+            self._thread.join()
+        self.flush()
@@ -1,32 +1,186 @@
-from sqlalchemy import create_engine, Identity
-from sqlalchemy.orm import declarative_base, sessionmaker, Mapped, mapped_column
+import asyncio
+from datetime import datetime, timezone
+from functools import cache
+from typing import Iterable, Optional
+from sqlalchemy import create_engine, event, insert, update, Identity
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession as _AsyncSession
+from sqlalchemy.orm import Session as _Session, declarative_base, sessionmaker, Mapped, mapped_column
 from src.config import settings
+from src.metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine
 
 Base = declarative_base()
 
-engine = create_engine(
-    url=settings.DATABASE_URL_psycopg,
-    # echo=True
+# Прагмы каждого соединения SQLite: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в режиме WAL не нарушает целостность базы при сбое,
+# busy_timeout ждет блокировку записи вместо немедленной ошибки
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
 )
-Session = sessionmaker(bind=engine)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Обработчик события connect движка SQLite"""
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _engine_options(url: str) -> dict:
+    """Параметры пула и соединений из настроек DB_POOL_*, DB_STATEMENT_TIMEOUT и DB_PREPARE_THRESHOLD"""
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if _is_sqlite(url):
+        # Файл базы не обрывает соединения: проверка и пересоздание соединений не нужны.
+        # Каждый поток берет из пула свое соединение, поэтому запрет общего использования потоками снят
+        options.update(pool_recycle=-1, pool_pre_ping=False, connect_args={"check_same_thread": False})
+    elif url.startswith("postgresql+psycopg"):
+        # psycopg готовит запрос на сервере после prepare_threshold выполнений, None - не готовить
+        connect_args = {"prepare_threshold": settings.DB_PREPARE_THRESHOLD}
+        if settings.DB_STATEMENT_TIMEOUT:
+            connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"
+        options["connect_args"] = connect_args
+    return options
+
+# Движки и фабрики сессий создаются при первом обращении, импорт модуля не требует настроек и базы
+
+@cache
+def get_engine() -> Engine:
+    engine = create_engine(
+        url=settings.DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        **_engine_options(settings.DATABASE_URL),
+        # echo=True
+    )
+    if _is_sqlite(settings.DATABASE_URL):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    instrument_engine(engine)
+    return engine
+
+@cache
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(bind=get_engine())
+
+def Session(**kwargs) -> _Session:
+    """Новая сессия основной базы"""
+    return get_sessionmaker()(**kwargs)
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    """Асинхронный движок для режима вебхука: psycopg поддерживает оба режима, для SQLite нужен aiosqlite"""
+    async_engine = create_async_engine(
+        url=settings.DATABASE_URL_async,
+        poolclass=InstrumentedAsyncQueuePool,
+        **_engine_options(settings.DATABASE_URL_async),
+    )
+    if _is_sqlite(settings.DATABASE_URL_async):
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+@cache
+def get_async_sessionmaker() -> async_sessionmaker:
+    return async_sessionmaker(bind=get_async_engine(), expire_on_commit=False)
+
+def AsyncSession(**kwargs) -> _AsyncSession:
+    """Новая асинхронная сессия основной базы"""
+    return get_async_sessionmaker()(**kwargs)
 
 class BaseModel(Base):
     __abstract__ = True
     __allow_unmapped__ = True
 
+    # В SQLite Identity не поддерживается, id выдает rowid
     id: Mapped[int] = mapped_column(Identity(), primary_key=True)
 
+    def __init_subclass__(cls, **kwargs):
+        # AUTOINCREMENT, как и Identity в Postgres, не выдает повторно id удаленных строк:
+        # на id слов ссылаются карточки в состояниях пользователей
+        table_args = cls.__dict__.get("__table_args__", ())
+        if isinstance(table_args, dict):
+            table_args = (table_args,)
+        if table_args and isinstance(table_args[-1], dict):
+            table_args = (*table_args[:-1], {"sqlite_autoincrement": True, **table_args[-1]})
+        else:
+            table_args = (*table_args, {"sqlite_autoincrement": True})
+        cls.__table_args__ = table_args
+        super().__init_subclass__(**kwargs)
+
 def create_tables():
-    from src.database.models import Word
-    
-    Base.metadata.create_all(engine)
+    """Приводит схему базы к текущей версии, см. src.database.migrations"""
+    from src.database.migrations import migrate
+
+    migrate(get_engine())
 
-    with Session() as session:
-        if session.query(Word).count() == 0:
-            add_sample_data(session)
+def warm_pool():
+    """Заранее открывает DB_POOL_SIZE соединений, чтобы первые запросы не ждали подключения к базе"""
+    engine = get_engine()
+    connections = []
+    try:
+        for _ in range(settings.DB_POOL_SIZE):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+async def warm_async_pool():
+    """То же, что warm_pool, для асинхронного движка"""
+    async_engine = get_async_engine()
+    connections = await asyncio.gather(*(async_engine.connect() for _ in range(settings.DB_POOL_SIZE)),
+                                       return_exceptions=True)
+    errors = [connection for connection in connections if isinstance(connection, BaseException)]
+    for connection in connections:
+        if not isinstance(connection, BaseException):
+            await connection.close()
+    if errors:
+        raise errors[0]
 
 def drop_tables():
-    Base.metadata.drop_all(engine)
+    from src.database.migrations import schema_version
+
+    Base.metadata.drop_all(get_engine())
+    schema_version.drop(get_engine(), checkfirst=True)
+
+def bump_dictionary_version(session) -> None:
+    """Отмечает изменение базовых слов в текущей транзакции, session - сессия или соединение"""
+    from src.database.models import DictionaryVersion
+
+    result = session.execute(update(DictionaryVersion.__table__).values(version=DictionaryVersion.version + 1))
+    if result.rowcount == 0:
+        session.execute(insert(DictionaryVersion.__table__).values(version=1))
+
+def seed_reviews(session, user_id: int, word_ids: Iterable[int], due_at: Optional[datetime] = None) -> None:
+    """Ставит слова в расписание повторений пользователя со сроком due_at, по умолчанию сейчас
+
+    Так собственные слова пользователя попадают на карточки через индекс (id_user, due_at).
+    Уже существующие записи расписания не меняются.
+    """
+    from src.database.models import Review
+
+    due_at = due_at or datetime.now(timezone.utc)
+    rows = [{"id_user": user_id, "id_word": word_id, "interval": 0, "ease": 2.5, "repetitions": 0, "due_at": due_at}
+            for word_id in dict.fromkeys(word_ids)]
+    if not rows:
+        return
+    insert_review = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+    session.execute(insert_review(Review.__table__).on_conflict_do_nothing(
+        index_elements=[Review.id_user, Review.id_word],
+    ), rows)
 
 def add_sample_data(session):
     from src.database.models import Word
@@ -45,9 +199,9 @@ def add_sample_data(session):
         {"model": "Word", "fields": {"rus": "Сыр", "eng": "Cheese", "is_main": True}},
     ]
 
-    for record in data:
-        model = {
-            'Word': Word,
-        }[record.get('model')]
-        session.add(model(id=record.get('pk'), **record.get('fields')))
-        session.commit()
\ No newline at end of file
+    models = {
+        'Word': Word,
+    }
+    session.add_all(models[record.get('model')](id=record.get('pk'), **record.get('fields')) for record in data)
+    bump_dictionary_version(session)
+    session.commit()
@@ -0,0 +1,75 @@
+"""Фоновое удаление слов, у которых не осталось ни одной связи с пользователями
+
+delete_user_word удаляет только связь пользователя со словом. Оставшееся без связей
+пользовательское слово никому не видно, поэтому его удаление можно отложить
+и выполнять пакетами вне обработки сообщений.
+"""
+import atexit
+from threading import Event, Thread
+from sqlalchemy import delete, select
+from src.database.base import Session
+from src.database.models import UserWord, Word
+from src.metrics import timed
+
+@timed("query")
+def sweep_orphan_words(batch_size: int = 1000) -> int:
+    """Удаляет пакет слов без связей, базовые слова не трогает
+
+    Args:
+        batch_size (int): Сколько слов удалять за одну транзакцию
+
+    Returns:
+        int: Количество удаленных слов
+    """
+    # Антиджойн по индексу userword.id_word
+    orphans = (
+        select(Word.id)
+        .outerjoin(UserWord, UserWord.id_word == Word.id)
+        .where(UserWord.id.is_(None), ~Word.is_main)
+        .limit(batch_size)
+    )
+    with Session() as session:
+        # Условие повторяется в самом DELETE на случай, если слово успели связать заново
+        result = session.execute(delete(Word).where(Word.id.in_(orphans), ~Word.userword.any()))
+        session.commit()
+        return result.rowcount
+
+class OrphanSweeper:
+    """Поток, который раз в interval секунд удаляет слова без связей пакетами по batch_size
+
+    Args:
+        interval (float): Период запуска в секундах, 0 - не запускать
+        batch_size (int): Размер пакета удаления
+    """
+
+    def __init__(self, interval: float, batch_size: int = 1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = Thread(target=self._loop, name="orphan-sweeper", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def sweep(self) -> int:
+        """Удаляет все слова без связей, возвращает их количество"""
+        total = 0
+        while not self._stop.is_set():
+            deleted = sweep_orphan_words(self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+        return total
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Не удалось удалить слова без связей: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,294 @@
+"""Индекс похожих слов для вариантов ответа
+
+Для каждого слова в таблице word_distractor хранится ранжированный список слов
+с близким английским написанием: по расстоянию Левенштейна, затем по разнице длины.
+При показе карточки варианты берутся одним запросом по индексу (id_word, rank).
+
+Расстояния считаются пакетно в NumPy сразу для группы слов против всего словаря.
+DistractorIndexer в фоне дополняет индекс для новых слов и пересчитывает списки
+старых слов, которым новое слово подходит лучше уже сохраненных вариантов.
+Полная перестройка, в том числе первая для большого словаря, выполняется
+отдельным процессом: python -m src.database.distractors
+"""
+import argparse
+import atexit
+from threading import Event, Thread
+from typing import Optional, Sequence
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from src.database.base import Session
+from src.database.models import Word, WordDistractor
+from src.metrics import timed
+
+# Сколько похожих слов хранить для каждого слова
+DISTRACTOR_COUNT = 10
+# Ограничение размера промежуточных матриц: группа слов * словарь,
+# а также группа слов * самая большая группа слов одной длины * длина слова
+_MAX_CELLS = 1 << 22
+
+def _encode(words: Sequence[str], pad: int = -1) -> tuple[np.ndarray, np.ndarray]:
+    """Коды символов слов матрицей (слово, позиция), дополненной pad, и длины слов"""
+    lengths = np.fromiter((len(word) for word in words), dtype=np.int32, count=len(words))
+    codes = np.full((len(words), max(int(lengths.max(initial=0)), 1)), pad, dtype=np.int32)
+    for index, word in enumerate(words):
+        codes[index, :len(word)] = np.frombuffer(word.encode("utf-32-le"), dtype=np.uint32)
+    return codes, lengths
+
+def edit_distances(targets: Sequence[str], vocabulary: Sequence[str]) -> np.ndarray:
+    """Расстояния Левенштейна от каждого слова targets до каждого слова vocabulary
+
+    Returns:
+        np.ndarray: Матрица (len(targets), len(vocabulary))
+    """
+    return _edit_distances(*_encode(targets), *_encode(vocabulary))
+
+def _edit_distances(target_codes: np.ndarray, target_lengths: np.ndarray,
+                    vocabulary_codes: np.ndarray, vocabulary_lengths: np.ndarray) -> np.ndarray:
+    """edit_distances по заранее закодированным словам
+
+    Строки матрицы динамического программирования считаются сразу для всех пар.
+    Вставки внутри строки учитываются накопленным минимумом:
+    D[i][j] = min(C[k] + j - k) по k <= j, где C - строка без учета вставок.
+    Номер столбца - первая ось, чтобы накопленный минимум шел по длинным непрерывным строкам.
+    """
+    # int16 вдвое сокращает объем памяти, который проходит каждая операция
+    columns = np.arange(vocabulary_codes.shape[1] + 1, dtype=np.int16)[:, None, None]
+    vocabulary_codes = vocabulary_codes.T[:, None, :]
+    vocabulary_index = np.arange(len(vocabulary_lengths))
+
+    row = np.broadcast_to(columns, (len(columns), len(target_lengths), len(vocabulary_lengths))).copy()
+    current = np.empty_like(row)
+    result = np.empty((len(target_lengths), len(vocabulary_lengths)), dtype=np.int32)
+    result[target_lengths == 0] = vocabulary_lengths
+    for i in range(1, target_codes.shape[1] + 1):
+        mismatch = target_codes[None, :, i - 1, None] != vocabulary_codes
+        current[0] = i
+        np.add(row[:-1], mismatch, out=current[1:])
+        np.add(row[1:], 1, out=row[1:])
+        np.minimum(current[1:], row[1:], out=current[1:])
+        np.subtract(current, columns, out=current)
+        np.minimum.accumulate(current, axis=0, out=row)
+        np.add(row, columns, out=row)
+
+        finished = np.flatnonzero(target_lengths == i)
+        if finished.size:
+            result[finished] = row[vocabulary_lengths[None, :], finished[:, None], vocabulary_index[None, :]]
+    return result
+
+class _Vocabulary:
+    """Все слова базы в массивах для пакетного расчета
+
+    Словарь разбит на группы слов одной длины, каждая группа дополняется только до своей
+    длины. Поэтому одно длинное слово не удлиняет расчет для всех остальных слов.
+    """
+
+    def __init__(self, rows):
+        self.ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.words = [row.eng.lower() for row in rows]
+        self.lengths = np.fromiter((len(word) for word in self.words), dtype=np.int32, count=len(self.words))
+        # Номера различных строк, чтобы сравнивать слова целыми числами
+        self.rus = np.unique(np.array([row.rus for row in rows], dtype=object), return_inverse=True)[1]
+        self.eng = np.unique(np.array(self.words, dtype=object), return_inverse=True)[1]
+        self.positions = {word_id: position for position, word_id in enumerate(self.ids.tolist())}
+
+        order = np.argsort(self.lengths, kind="stable")
+        # (позиции слов группы, их коды, их длины)
+        self.groups = []
+        for group in np.split(order, np.flatnonzero(np.diff(self.lengths[order])) + 1):
+            if group.size:
+                self.groups.append((group, *_encode([self.words[position] for position in group])))
+
+    def batches(self, positions: np.ndarray):
+        """Делит позиции слов на группы близкой длины, для которых матрицы расчета укладываются в _MAX_CELLS
+
+        Слова идут по возрастанию длины, поэтому длина группы почти не превышает длину ее слов.
+        """
+        cells = max([len(self.ids)] + [len(group) * (codes.shape[1] + 1) for group, codes, _ in self.groups])
+        size = max(1, _MAX_CELLS // cells)
+        positions = positions[np.argsort(self.lengths[positions], kind="stable")]
+        for start in range(0, len(positions), size):
+            yield positions[start:start + size]
+
+    def distances(self, positions: np.ndarray) -> np.ndarray:
+        """Расстояния от слов на позициях positions до всего словаря, неподходящие пары - -1
+
+        Неподходящие: то же слово, тот же перевод или то же русское слово,
+        иначе на карточке оказалось бы несколько верных ответов.
+        """
+        target_codes, target_lengths = _encode([self.words[position] for position in positions])
+        distances = np.empty((len(positions), len(self.ids)), dtype=np.int32)
+        for group, codes, lengths in self.groups:
+            distances[:, group] = _edit_distances(target_codes, target_lengths, codes, lengths)
+        invalid = ((self.eng[positions, None] == self.eng[None, :])
+                   | (self.rus[positions, None] == self.rus[None, :]))
+        distances[invalid] = -1
+        return distances
+
+    def rank(self, positions: np.ndarray, distances: np.ndarray, count: int) -> list[dict]:
+        """Строки word_distractor: лучшие count слов для каждого слова из positions"""
+        # Составной ключ: расстояние, затем разница длины
+        scale = int(self.lengths.max(initial=0)) + 1
+        keys = distances.astype(np.int64) * scale + np.abs(self.lengths[None, :] - self.lengths[positions, None])
+        keys[distances < 0] = np.iinfo(np.int64).max
+        count = min(count, keys.shape[1])
+        if count == 0:
+            return []
+        best = np.argpartition(keys, count - 1, axis=1)[:, :count]
+        best = np.take_along_axis(best, np.argsort(np.take_along_axis(keys, best, axis=1), axis=1), axis=1)
+
+        rows = []
+        for row, target in enumerate(positions):
+            for rank, candidate in enumerate(best[row]):
+                distance = int(distances[row, candidate])
+                if distance < 0:
+                    # Дальше только неподходящие пары
+                    break
+                rows.append({"id_word": int(self.ids[target]), "id_distractor": int(self.ids[candidate]),
+                             "rank": rank, "distance": distance})
+        return rows
+
+def _load_vocabulary(session) -> _Vocabulary:
+    return _Vocabulary(session.execute(select(Word.id, Word.rus, Word.eng).order_by(Word.id)).all())
+
+def _write(session, vocabulary: _Vocabulary, positions: np.ndarray, count: int,
+           stop: Optional[Event] = None) -> np.ndarray:
+    """Пересчитывает и сохраняет списки слов на позициях positions
+
+    Каждая группа слов сохраняется отдельной транзакцией, после установки stop
+    следующие группы не считаются.
+
+    Returns:
+        np.ndarray: Для каждого слова словаря наименьшее расстояние до слов positions
+    """
+    closest = np.full(len(vocabulary.ids), np.iinfo(np.int32).max, dtype=np.int32)
+    for batch in vocabulary.batches(positions):
+        if stop is not None and stop.is_set():
+            break
+        distances = vocabulary.distances(batch)
+        rows = vocabulary.rank(batch, distances, count)
+        session.execute(delete(WordDistractor).where(WordDistractor.id_word.in_(vocabulary.ids[batch].tolist())))
+        if rows:
+            session.execute(insert(WordDistractor.__table__), rows)
+        session.commit()
+        np.minimum(closest, np.where(distances < 0, closest, distances).min(axis=0), out=closest)
+    return closest
+
+@timed("query")
+def rebuild_distractors(count: int = DISTRACTOR_COUNT) -> int:
+    """Пересчитывает списки похожих слов для всего словаря, возвращает количество слов"""
+    with Session() as session:
+        vocabulary = _load_vocabulary(session)
+        _write(session, vocabulary, np.arange(len(vocabulary.ids)), count)
+        return len(vocabulary.ids)
+
+@timed("query")
+def count_unindexed_words() -> int:
+    """Количество слов, для которых еще нет списка похожих слов"""
+    with Session() as session:
+        has_list = select(WordDistractor.id).where(WordDistractor.id_word == Word.id).exists()
+        return session.scalar(select(func.count(Word.id)).where(~has_list))
+
+@timed("query")
+def index_new_words(count: int = DISTRACTOR_COUNT, stop: Optional[Event] = None) -> int:
+    """Строит списки для слов без списка и обновляет списки, в которые попадают новые слова
+
+    Расстояние симметрично, поэтому расчет для новых слов заодно дает их расстояния
+    до всех старых. Старое слово пересчитывается, если новое ближе худшего из его
+    сохраненных вариантов или список еще не заполнен. После установки stop
+    расчет прерывается, оставшиеся слова будут обработаны при следующем запуске.
+
+    Returns:
+        int: Количество пересчитанных слов
+    """
+    with Session() as session:
+        has_list = select(WordDistractor.id).where(WordDistractor.id_word == Word.id).exists()
+        if session.scalar(select(Word.id).where(~has_list).limit(1)) is None:
+            return 0
+
+        vocabulary = _load_vocabulary(session)
+        # Для слова без списка - -1, такие слова пересчитываются как новые
+        worst = np.full(len(vocabulary.ids), -1, dtype=np.int32)
+        lists = session.execute(
+            select(WordDistractor.id_word, func.count(WordDistractor.id), func.max(WordDistractor.distance))
+            .group_by(WordDistractor.id_word)
+        )
+        for id_word, size, distance in lists:
+            position = vocabulary.positions.get(id_word)
+            if position is not None:
+                worst[position] = distance if size >= count else np.iinfo(np.int32).max
+
+        new = np.flatnonzero(worst < 0)
+        if not new.size:
+            return 0
+        closest = _write(session, vocabulary, new, count, stop)
+        if stop is not None and stop.is_set():
+            return int(new.size)
+        affected = np.flatnonzero((worst >= 0) & (closest < worst))
+        if affected.size:
+            _write(session, vocabulary, affected, count, stop)
+        return int(new.size + affected.size)
+
+class DistractorIndexer:
+    """Поток, который раз в interval секунд дополняет индекс похожих слов для новых слов
+
+    Расчет для новых слов занимает время, пропорциональное их числу, умноженному на размер словаря,
+    поэтому поток берется только за проходы не больше max_new слов, например после загрузки
+    пользователем своего файла. Индекс для большего числа слов, в том числе для новой базы,
+    строится командой python -m src.database.distractors вне процесса бота.
+    close прерывает текущий проход после сохранения очередной группы слов.
+
+    Args:
+        interval (float): Период запуска в секундах, 0 - не запускать
+        count (int): Сколько похожих слов хранить для слова
+        max_new (int): Наибольшее число слов без списка, для которых поток строит списки сам
+    """
+
+    def __init__(self, interval: float, count: int = DISTRACTOR_COUNT, max_new: int = 1000):
+        self.interval = interval
+        self.count = count
+        self.max_new = max_new
+        self._warned = False
+        self._stop = Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = Thread(target=self._loop, name="distractor-indexer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._index()
+            except Exception as e:
+                print(f"Не удалось обновить индекс похожих слов: {e}")
+            self._stop.wait(self.interval)
+
+    def _index(self) -> None:
+        missing = count_unindexed_words()
+        if missing > self.max_new:
+            # Предупреждение одно на каждый раз, когда таких слов стало слишком много
+            if not self._warned:
+                print(f"Нет списков похожих слов для {missing} слов, это больше {self.max_new}:"
+                      f" постройте индекс командой python -m src.database.distractors --new")
+                self._warned = True
+            return
+        self._warned = False
+        if missing:
+            index_new_words(self.count, self._stop)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Построение индекса похожих слов")
+    parser.add_argument("--count", type=int, default=DISTRACTOR_COUNT, help="сколько похожих слов хранить для слова")
+    parser.add_argument("--new", action="store_true",
+                        help="только списки для слов без списка и затронутые ими, а не полная перестройка")
+    args = parser.parse_args()
+
+    if args.new:
+        print(f"Пересчитано слов: {index_new_words(args.count)}")
+    else:
+        print(f"Пересчитано слов: {rebuild_distractors(args.count)}")
@@ -0,0 +1,218 @@
+"""Массовая загрузка слов из CSV или JSON
+
+Файл читается потоком, строки дедуплицируются с уже существующими словами
+и записываются одной транзакцией: в Postgres базовый словарь пишется через COPY,
+в остальных случаях - пакетными многострочными INSERT.
+
+Запуск из командной строки:
+    python -m src.database.importer words.csv --main
+"""
+import argparse
+import csv
+import itertools
+import json
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator, Optional
+from sqlalchemy import insert, select
+from src.database.base import Session, bump_dictionary_version, seed_reviews
+from src.database.models import UserWord, Word
+from src.database.validation import is_eng_word, is_rus_word
+
+BATCH_SIZE = 5000
+
+@dataclass
+class ImportResult:
+    """Итог загрузки: сколько слов создано, сколько связано с пользователем, сколько пропущено
+
+    invalid - строки, не прошедшие те же проверки, что и ручное добавление слова, они входят в skipped.
+    truncated - в файле было больше max_rows строк, остальные не читались.
+    """
+    added: int = 0
+    linked: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    truncated: bool = False
+
+def read_words(stream: IO[str], fmt: str) -> Iterator[tuple[str, str]]:
+    """Читает пары (русское, английское) из потока
+
+    CSV - две колонки rus, eng, заголовок необязателен.
+    JSON - массив объектов {"rus": ..., "eng": ...} или по одному объекту в строке (JSON Lines).
+    Значения не проверяются, это делает import_words.
+
+    Args:
+        stream (IO[str]): Текстовый поток
+        fmt (str): Формат файла: csv или json
+
+    Raises:
+        ValueError: Файл не разбирается в выбранном формате
+    """
+    if fmt == "csv":
+        try:
+            for row in csv.reader(stream):
+                if len(row) < 2 or (row[0].strip().lower(), row[1].strip().lower()) == ("rus", "eng"):
+                    continue
+                yield row[0], row[1]
+        except csv.Error as e:
+            raise ValueError(f"Некорректный CSV: {e}") from e
+        return
+
+    first_line = stream.readline()
+    if first_line.lstrip().startswith("["):
+        # Обычный JSON-массив приходится разбирать целиком
+        items = json.loads(first_line + stream.read())
+    else:
+        items = (json.loads(line) for line in itertools.chain([first_line], stream) if line.strip())
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Ожидался объект JSON с полями rus и eng")
+        yield item.get("rus"), item.get("eng")
+
+def _normalize(word: str) -> str:
+    # Пробелы внутри значения не склеиваются: "Привет мир" - два слова, его отклонит проверка
+    return word.strip().capitalize()
+
+def _clean_pair(rus, eng) -> Optional[tuple[str, str]]:
+    """Нормализованная пара или None, если она не проходит проверки ручного добавления слова"""
+    if not isinstance(rus, str) or not isinstance(eng, str):
+        return None
+    rus, eng = _normalize(rus), _normalize(eng)
+    if not is_rus_word(rus) or not is_eng_word(eng):
+        return None
+    return rus, eng
+
+def _limited(rows: Iterable[tuple[str, str]], max_rows: int, result: ImportResult) -> Iterator[tuple[str, str]]:
+    for index, row in enumerate(rows):
+        if index >= max_rows:
+            result.truncated = True
+            return
+        yield row
+
+def _batches(rows: Iterable[tuple[str, str]], size: int) -> Iterator[list[tuple[str, str]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_words(rows: Iterable[tuple[str, str]], is_main: bool = False, user_id: Optional[int] = None,
+                 batch_size: int = BATCH_SIZE, max_rows: Optional[int] = None) -> ImportResult:
+    """Загружает слова в базу одной транзакцией
+
+    Пары, не прошедшие проверки src.database.validation, пропускаются.
+    Слово с уже существующей парой (rus, eng) не создается повторно. Новый перевод
+    существующего русского слова получает следующий номер версии, как в add_user_word.
+    Если указан user_id, новые и найденные слова связываются с пользователем.
+
+    Args:
+        rows (Iterable[tuple[str, str]]): Пары (русское, английское)
+        is_main (bool): Загружать в базовый словарь
+        user_id (Optional[int]): ID пользователя, в словарь которого добавляются слова
+        batch_size (int): Размер пакета записи
+        max_rows (Optional[int]): Сколько строк загрузить, остальные отбрасываются, None - без ограничения
+
+    Returns:
+        ImportResult: Итог загрузки
+    """
+    result = ImportResult()
+    if max_rows is not None:
+        rows = _limited(rows, max_rows, result)
+    # Пары, уже встреченные в файле
+    seen: set[tuple[str, str]] = set()
+    # (rus, eng) -> id слов из базы (0 для базовых), rus -> максимальный номер версии
+    known: dict[tuple[str, str], int] = {}
+    max_number: dict[str, int] = {}
+
+    with Session() as session:
+        use_copy = session.bind.dialect.name == "postgresql" and user_id is None
+        for batch in _batches(rows, batch_size):
+            pairs = []
+            for rus, eng in batch:
+                pair = _clean_pair(rus, eng)
+                if pair is None:
+                    result.invalid += 1
+                if pair is None or pair in seen:
+                    result.skipped += 1
+                    continue
+                seen.add(pair)
+                pairs.append(pair)
+
+            # Подтягиваем существующие версии русских слов из пакета
+            new_rus = {rus for rus, _ in pairs if rus not in max_number}
+            if new_rus:
+                stmt = select(Word.id, Word.rus, Word.eng, Word.number, Word.is_main).where(Word.rus.in_(new_rus))
+                for word_id, rus, eng, number, word_is_main in session.execute(stmt):
+                    # Базовые слова и так видны всем, связывать их с пользователем не нужно
+                    known[(rus, eng)] = 0 if word_is_main else word_id
+                    max_number[rus] = max(max_number.get(rus, 0), number)
+
+            new_words = []
+            existing_ids = []
+            for rus, eng in pairs:
+                if (rus, eng) in known:
+                    if known[(rus, eng)]:
+                        existing_ids.append(known[(rus, eng)])
+                    result.skipped += 1
+                    continue
+                max_number[rus] = max_number.get(rus, 0) + 1
+                new_words.append({"rus": rus, "eng": eng, "number": max_number[rus], "is_main": is_main})
+
+            if use_copy:
+                _copy_words(session, new_words)
+            elif new_words:
+                inserted = session.execute(insert(Word).returning(Word.id, Word.rus, Word.eng), new_words)
+                for word_id, rus, eng in inserted:
+                    known[(rus, eng)] = word_id
+            result.added += len(new_words)
+
+            if user_id is not None:
+                result.linked += _link_words(session, user_id, [known[(w["rus"], w["eng"])] for w in new_words] + existing_ids)
+
+        if is_main and result.added:
+            bump_dictionary_version(session)
+        session.commit()
+    return result
+
+def _copy_words(session, words: list[dict]) -> None:
+    """Пишет слова через COPY, самый быстрый способ загрузки в Postgres"""
+    if not words:
+        return
+    cursor = session.connection().connection.cursor()
+    with cursor.copy("COPY word (rus, eng, number, is_main) FROM STDIN") as copy:
+        for word in words:
+            copy.write_row((word["rus"], word["eng"], word["number"], word["is_main"]))
+
+def _link_words(session, user_id: int, word_ids: list[int]) -> int:
+    """Связывает слова с пользователем, пропуская уже связанные"""
+    if not word_ids:
+        return 0
+    linked = set(session.scalars(select(UserWord.id_word).where(UserWord.id_user == user_id, UserWord.id_word.in_(word_ids))))
+    links = [{"id_user": user_id, "id_word": word_id} for word_id in dict.fromkeys(word_ids) if word_id not in linked]
+    if links:
+        session.execute(insert(UserWord), links)
+        seed_reviews(session, user_id, [link["id_word"] for link in links])
+    return len(links)
+
+def import_file(path: str, fmt: Optional[str] = None, **kwargs) -> ImportResult:
+    """Загружает слова из файла, формат по умолчанию определяется по расширению"""
+    fmt = fmt or ("json" if path.endswith((".json", ".jsonl")) else "csv")
+    with open(path, encoding="utf-8", newline="") as stream:
+        return import_words(read_words(stream, fmt), **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка слов из CSV или JSON")
+    parser.add_argument("path", help="путь к файлу")
+    parser.add_argument("--format", choices=["csv", "json"], help="формат файла, по умолчанию по расширению")
+    parser.add_argument("--main", action="store_true", help="загрузить в базовый словарь")
+    parser.add_argument("--user", type=int, help="ID пользователя в базе, в словарь которого добавить слова")
+    args = parser.parse_args()
+    if not args.main and args.user is None:
+        # Слово вне базового словаря и без связей никому не видно и будет удалено очисткой
+        parser.error("укажите --main или --user")
+
+    result = import_file(args.path, args.format, is_main=args.main, user_id=args.user)
+    print(f"Добавлено: {result.added}, связано с пользователем: {result.linked}, пропущено: {result.skipped}"
+          f" (с ошибками: {result.invalid})")
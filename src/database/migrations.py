@@ -0,0 +1,153 @@
+"""Версионные миграции схемы базы
+
+Номер версии схемы хранится в таблице schema_version. При запуске migrate
+читает его одним запросом и, если схема уже актуальна, больше ничего не делает.
+Иначе по порядку применяются недостающие миграции, каждая в той же транзакции,
+что и запись нового номера версии.
+
+Миграции должны быть идемпотентными: базы, созданные до появления schema_version,
+начинают с версии 0 и проходят все миграции поверх уже существующих таблиц.
+"""
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, delete, func, insert, inspect, literal, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from src.database.base import Base, add_sample_data, bump_dictionary_version
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, nullable=False),
+)
+
+# Произвольный ключ advisory-блокировки Postgres, чтобы миграции не запускались параллельно из нескольких процессов
+_LOCK_KEY = 7302214
+
+def _create_schema(conn: Connection) -> None:
+    """Таблицы моделей и базовый словарь для новой базы"""
+    from src.database import models
+
+    Base.metadata.create_all(conn)
+    if conn.scalar(select(func.count(models.Word.id))) == 0:
+        with Session(bind=conn) as session:
+            add_sample_data(session)
+
+def _unique_words(conn: Connection) -> None:
+    """Уникальные (rus, eng) и (id_user, id_word) для существующих баз
+
+    Перед созданием индексов дубликаты слов сливаются в слово с меньшим id,
+    повторные связи удаляются. Связи с базовыми словами тоже удаляются:
+    базовые слова видны всем и не связываются с пользователями.
+    """
+    from src.database import models
+
+    kept = "SELECT min(id) FROM word GROUP BY rus, eng"
+    conn.execute(text("""
+        UPDATE word SET is_main = TRUE
+        WHERE id IN (SELECT min(id) FROM word GROUP BY rus, eng HAVING max(CASE WHEN is_main THEN 1 ELSE 0 END) = 1)
+    """))
+    conn.execute(text(f"""
+        UPDATE userword SET id_word = (
+            SELECT min(other.id) FROM word AS duplicate
+            JOIN word AS other ON other.rus = duplicate.rus AND other.eng = duplicate.eng
+            WHERE duplicate.id = userword.id_word
+        )
+        WHERE id_word NOT IN ({kept})
+    """))
+    # review уникален по (id_user, id_word), поэтому расписание дубликатов не переносится, а удаляется
+    conn.execute(text(f"DELETE FROM review WHERE id_word NOT IN ({kept})"))
+    conn.execute(text(f"DELETE FROM word WHERE id NOT IN ({kept})"))
+    conn.execute(text("DELETE FROM userword WHERE id NOT IN (SELECT min(id) FROM userword GROUP BY id_user, id_word)"))
+    conn.execute(text("DELETE FROM userword WHERE id_word IN (SELECT id FROM word WHERE is_main)"))
+
+    # Индекс по id_user заменен уникальным индексом (id_user, id_word)
+    conn.execute(text("DROP INDEX IF EXISTS ix_userword_id_user"))
+    for table in (models.Word.__table__, models.UserWord.__table__):
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _answer_stats(conn: Connection) -> None:
+    """Журнал ответов и счетчики статистики пользователей"""
+    from src.database import models
+
+    models.AnswerEvent.__table__.create(conn, checkfirst=True)
+    models.UserStats.__table__.create(conn, checkfirst=True)
+
+def _word_distractors(conn: Connection) -> None:
+    """Индекс похожих слов, заполняется в фоне src.database.distractors.DistractorIndexer"""
+    from src.database import models
+
+    models.WordDistractor.__table__.create(conn, checkfirst=True)
+
+def _dictionary_version(conn: Connection) -> None:
+    """Версия базового словаря для снимков словаря в процессах бота"""
+    from src.database import models
+
+    models.DictionaryVersion.__table__.create(conn, checkfirst=True)
+    bump_dictionary_version(conn)
+
+def _new_word_queue(conn: Connection) -> None:
+    """Курсор новых базовых слов и расписание для уже добавленных собственных слов
+
+    Собственные слова теперь попадают на карточки только через review, поэтому связям
+    без записи расписания она создается, а записи удаленных связей удаляются.
+    """
+    from src.database import models
+
+    if "new_word_cursor" not in {column["name"] for column in inspect(conn).get_columns("user")}:
+        conn.execute(text('ALTER TABLE "user" ADD COLUMN new_word_cursor INTEGER NOT NULL DEFAULT 0'))
+
+    Review, UserWord, Word = models.Review, models.UserWord, models.Word
+    scheduled = select(Review.id).where(Review.id_user == UserWord.id_user, Review.id_word == UserWord.id_word).exists()
+    conn.execute(insert(Review.__table__).from_select(
+        ["id_user", "id_word", "interval", "ease", "repetitions", "due_at"],
+        select(UserWord.id_user, UserWord.id_word, literal(0.0), literal(2.5), literal(0),
+               literal(datetime.now(timezone.utc), DateTime(timezone=True)))
+        .join(Word, Word.id == UserWord.id_word)
+        .where(~Word.is_main, ~scheduled),
+    ))
+    linked = select(UserWord.id).where(UserWord.id_user == Review.id_user, UserWord.id_word == Review.id_word).exists()
+    own_words = select(Word.id).where(~Word.is_main)
+    conn.execute(delete(Review.__table__).where(Review.id_word.in_(own_words), ~linked))
+
+# Миграция с номером N переводит схему из версии N - 1 в версию N
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _create_schema,
+    _unique_words,
+    _answer_stats,
+    _word_distractors,
+    _dictionary_version,
+    _new_word_queue,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+def current_version(engine: Engine) -> Optional[int]:
+    """Версия схемы или None, если таблицы schema_version еще нет"""
+    try:
+        with engine.connect() as conn:
+            return conn.scalar(select(schema_version.c.version))
+    except DBAPIError:
+        return None
+
+def migrate(engine: Engine) -> int:
+    """Применяет недостающие миграции и возвращает итоговую версию схемы"""
+    # Быстрый путь: один запрос без разбора схемы
+    if current_version(engine) == LATEST_VERSION:
+        return LATEST_VERSION
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(select(func.pg_advisory_xact_lock(_LOCK_KEY)))
+        schema_version.create(conn, checkfirst=True)
+        version = conn.scalar(select(schema_version.c.version))
+        if version is None:
+            conn.execute(schema_version.insert().values(version=0))
+            version = 0
+
+        for number in range(version + 1, LATEST_VERSION + 1):
+            MIGRATIONS[number - 1](conn)
+            conn.execute(update(schema_version).values(version=number))
+            print(f"Схема базы обновлена до версии {number}")
+    return LATEST_VERSION
@@ -1,4 +1,5 @@
-from sqlalchemy import ForeignKey, Integer, String, Boolean, BigInteger
+from datetime import datetime
+from sqlalchemy import ForeignKey, Integer, String, Boolean, BigInteger, DateTime, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from src.database.base import BaseModel
 
@@ -7,6 +8,8 @@ class User(BaseModel):
 
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
     telegram_username: Mapped[str] = mapped_column(String, nullable=True)
+    # Базовые слова с id не больше курсора уже стоят в расписании повторений пользователя
+    new_word_cursor: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     userword: Mapped[list["UserWord"]] = relationship("UserWord", back_populates="user", cascade="all, delete-orphan")
 
@@ -19,16 +22,24 @@ class User(BaseModel):
 
 class UserWord(BaseModel):
     __tablename__ = "userword"
+    __table_args__ = (
+        # Уникальный индекс заодно обслуживает поиск по id_user
+        Index("uq_userword_user_word", "id_user", "id_word", unique=True),
+    )
 
     id_user: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
-    id_word:Mapped[int] = mapped_column(ForeignKey("word.id"), nullable=False)
+    id_word:Mapped[int] = mapped_column(ForeignKey("word.id"), nullable=False, index=True)
 
     user: Mapped["User"] = relationship("User", back_populates="userword")
     word: Mapped["Word"] = relationship("Word", back_populates="userword")
 
 class Word(BaseModel):
     __tablename__ = "word"
-    
+    __table_args__ = (
+        # Одна пара переводов - одно слово, новые переводы получают следующий номер версии
+        Index("uq_word_rus_eng", "rus", "eng", unique=True),
+    )
+
     rus: Mapped[str] = mapped_column(nullable=False) 
     eng: Mapped[str] = mapped_column(nullable=False)
     number: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
@@ -53,4 +64,76 @@ class Word(BaseModel):
             'eng': self.eng,
             'number': self.number,
             'is_main': self.is_main,
-        }
\ No newline at end of file
+        }
+
+class Review(BaseModel):
+    """Состояние интервального повторения слова для пользователя
+
+    Хранится отдельно от UserWord: базовые слова не имеют связей с пользователями,
+    но тоже повторяются по расписанию. Собственные слова пользователя получают запись
+    сразу при добавлении (src.database.base.seed_reviews), базовые - после первого ответа
+    или пропуска карточки.
+    """
+    __tablename__ = "review"
+    __table_args__ = (
+        UniqueConstraint("id_user", "id_word"),
+        Index("ix_review_user_due", "id_user", "due_at"),
+    )
+
+    id_user: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    id_word: Mapped[int] = mapped_column(ForeignKey("word.id", ondelete="CASCADE"), nullable=False)
+    interval: Mapped[float] = mapped_column(Float, default=0, nullable=False)
+    ease: Mapped[float] = mapped_column(Float, default=2.5, nullable=False)
+    repetitions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"{self.id_user}:{self.id_word} due {self.due_at} [{self.interval} d, x{self.ease}]"
+
+class AnswerEvent(BaseModel):
+    """Ответ пользователя на карточку, записывается пакетами через src.database.answer_log"""
+    __tablename__ = "answer_event"
+    __table_args__ = (
+        Index("ix_answer_event_user_time", "id_user", "answered_at"),
+    )
+
+    id_user: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    # Без внешнего ключа: событие может записаться уже после удаления слова
+    id_word: Mapped[int] = mapped_column(Integer, nullable=False)
+    correct: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    answered_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+class UserStats(BaseModel):
+    """Счетчики ответов пользователя, обновляются вместе с записью пакета AnswerEvent"""
+    __tablename__ = "user_stats"
+
+    id_user: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), unique=True, nullable=False)
+    answers: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    correct: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_answer_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class WordDistractor(BaseModel):
+    """Похожее слово для вариантов ответа, список на слово ранжирован по rank
+
+    Заполняется фоновой задачей src.database.distractors.
+    """
+    __tablename__ = "word_distractor"
+    __table_args__ = (
+        Index("uq_word_distractor_rank", "id_word", "rank", unique=True),
+    )
+
+    id_word: Mapped[int] = mapped_column(ForeignKey("word.id", ondelete="CASCADE"), nullable=False)
+    id_distractor: Mapped[int] = mapped_column(ForeignKey("word.id", ondelete="CASCADE"), nullable=False, index=True)
+    rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Расстояние Левенштейна между английскими словами
+    distance: Mapped[int] = mapped_column(Integer, nullable=False)
+
+class DictionaryVersion(BaseModel):
+    """Номер версии базового словаря, одна строка
+
+    Увеличивается через src.database.base.bump_dictionary_version при любом изменении
+    базовых слов, по нему процессы бота перечитывают снимок словаря.
+    """
+    __tablename__ = "dictionary_version"
+
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,19 @@
+"""Проверка слов перед записью в словарь
+
+Одни и те же правила действуют для ручного добавления слова в боте и для загрузки из файла.
+"""
+import re
+
+# Самые длинные обычные слова короче, а длинные строки замедляют расчет индекса похожих слов
+MAX_WORD_LENGTH = 50
+
+_RUS_WORD = re.compile(r'[а-яА-ЯёЁ\-]+')
+_ENG_WORD = re.compile(r'[A-Za-z\-]+')
+
+def is_rus_word(word) -> bool:
+    """Одно русское слово из букв и дефисов не длиннее MAX_WORD_LENGTH"""
+    return isinstance(word, str) and len(word) <= MAX_WORD_LENGTH and _RUS_WORD.fullmatch(word) is not None
+
+def is_eng_word(word) -> bool:
+    """Одно английское слово из латинских букв и дефисов не длиннее MAX_WORD_LENGTH"""
+    return isinstance(word, str) and len(word) <= MAX_WORD_LENGTH and _ENG_WORD.fullmatch(word) is not None
@@ -1,10 +1,34 @@
-from src.database.base import create_tables
-from src.bot.core import bot
-from src.bot import handlers
+import asyncio
+from src.config import settings
+from src.database.base import create_tables, warm_pool
+from src.database.cleanup import OrphanSweeper
+from src.database.distractors import DistractorIndexer
+from src.metrics import start_metrics_server
 
 def main():
     create_tables()
-    bot.infinity_polling(skip_pending=True)
+    start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    sweeper = OrphanSweeper(settings.ORPHAN_SWEEP_INTERVAL, settings.ORPHAN_SWEEP_BATCH)
+    indexer = DistractorIndexer(settings.DISTRACTOR_INTERVAL, max_new=settings.DISTRACTOR_MAX_NEW_WORDS)
+    if settings.DISPATCH_WORKERS > 0:
+        from src.bot.dispatcher import run_dispatcher
+        run_dispatcher()
+    elif settings.BOT_MODE == "webhook":
+        from src.bot.aio.webhook import run_webhook
+        asyncio.run(run_webhook())
+    else:
+        from src.bot.core import get_bot, get_outbox
+        from src.bot.handlers import register_handlers
+        from src.bot.queries import get_answer_log
+        bot, outbox = get_bot(), get_outbox()
+        register_handlers(bot, outbox)
+        warm_pool()
+        print("Бот запущен!")
+        bot.infinity_polling(skip_pending=True)
+        outbox.close()
+        get_answer_log().close()
+    indexer.close()
+    sweeper.close()
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
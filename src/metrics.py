@@ -0,0 +1,207 @@
+"""Замеры задержек обработчиков, запросов и SQL с выдачей в формате Prometheus
+
+Обработчики и функции запросов оборачиваются декоратором timed, SQL-запросы,
+ошибки базы и ожидание соединения из пула замеряются через события SQLAlchemy.
+Данные отдаются на локальном HTTP-эндпоинте /metrics (настройка METRICS_PORT).
+"""
+import contextvars
+import functools
+import inspect
+import re
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Границы корзин гистограмм в секундах
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    """Хранилище гистограмм и счетчиков с метками"""
+
+    def __init__(self):
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._lock = Lock()
+
+    def observe(self, metric: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, metric: str, value: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + value
+
+    def render(self) -> str:
+        """Текст в формате Prometheus exposition"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"' for k, v in key)
+    return "{" + ",".join(escaped) + "}"
+
+registry = Registry()
+
+# Имя функции запросов, внутри которой выполняется SQL: метка для ошибок и запросов базы
+_current_query: contextvars.ContextVar[str] = contextvars.ContextVar("current_query", default="")
+
+def timed(kind: str):
+    """Декоратор: гистограмма bot_<kind>_duration_seconds и счетчик bot_<kind>_errors_total
+
+    Работает и с обычными функциями, и с корутинами.
+
+    Args:
+        kind (str): Вид функции: handler, query, state и т.п.
+    """
+    def decorator(func):
+        name = func.__name__
+        duration_metric = f"bot_{kind}_duration_seconds"
+        errors_metric = f"bot_{kind}_errors_total"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_query.set(name) if kind == "query" else None
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    registry.inc(errors_metric, name=name)
+                    raise
+                finally:
+                    registry.observe(duration_metric, time.perf_counter() - started, name=name)
+                    if token is not None:
+                        _current_query.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_query.set(name) if kind == "query" else None
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                registry.inc(errors_metric, name=name)
+                raise
+            finally:
+                registry.observe(duration_metric, time.perf_counter() - started, name=name)
+                if token is not None:
+                    _current_query.reset(token)
+        return wrapper
+    return decorator
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+)\s*\)")
+_SPACES = re.compile(r"\s+")
+
+def _statement_label(statement: str) -> str:
+    """Короткая метка SQL-запроса: списки IN сворачиваются, чтобы число меток было ограничено"""
+    statement = _IN_LIST.sub("(...)", _SPACES.sub(" ", statement).strip())
+    return statement[:120]
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключает замеры SQL-запросов и подсчет ошибок базы к движку"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        registry.observe("bot_sql_duration_seconds", time.perf_counter() - started,
+                         statement=_statement_label(statement), query=_current_query.get())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        statement = _statement_label(context.statement) if context.statement else ""
+        registry.inc("bot_sql_errors_total", statement=statement, query=_current_query.get())
+
+def log_error(error: Exception) -> None:
+    """Учитывает и печатает ошибку, которую функция запросов перехватила и не пробросила дальше"""
+    query = _current_query.get()
+    registry.inc("bot_query_errors_total", name=query)
+    print(f"Ошибка базы данных в {query or 'запросе'}: {error}")
+
+class _TimedCheckout:
+    """Замеряет время ожидания свободного соединения из пула"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe("bot_db_pool_wait_seconds", time.perf_counter() - started)
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host: str, port: int) -> Optional[ThreadingHTTPServer]:
+    """Запускает эндпоинт /metrics в фоновом потоке, port 0 - не запускать"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,42 @@
+"""Общие фикстуры тестов: каждый тест работает с новой базой SQLite во временном каталоге"""
+import pytest
+from src import config
+from src.bot import queries
+from src.database import base
+
+# Кэшированные на процесс объекты, которые зависят от настроек и базы
+_CACHED = (
+    config.get_settings,
+    base.get_engine, base.get_sessionmaker, base.get_async_engine, base.get_async_sessionmaker,
+    queries.get_deck_cache, queries.get_base_dictionary_cache, queries.get_card_prefetch, queries.get_answer_log,
+)
+
+def _reset() -> None:
+    for cached in _CACHED:
+        cached.cache_clear()
+
+@pytest.fixture
+def empty_database(tmp_path, monkeypatch):
+    """Настройки на пустой файл SQLite без схемы, возвращает движок"""
+    monkeypatch.setenv("TG_TOKEN", "123456:TEST")
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setenv("DB_URL", "")
+    # Без фоновых потоков: карточки и ответы обрабатываются сразу в потоке теста
+    monkeypatch.setenv("PREFETCH_DEPTH", "0")
+    monkeypatch.setenv("ANSWER_LOG_BATCH", "0")
+    _reset()
+    yield base.get_engine()
+    base.get_engine().dispose()
+    _reset()
+
+@pytest.fixture
+def database(empty_database):
+    """База SQLite со схемой текущей версии и базовым словарем, возвращает движок"""
+    base.create_tables()
+    return empty_database
+
+@pytest.fixture
+def user_id(database) -> int:
+    user_id, _ = queries.get_or_create_user(1, "test")
+    return user_id
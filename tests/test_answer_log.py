@@ -0,0 +1,27 @@
+from sqlalchemy import func, select
+from src.bot import queries
+from src.database.answer_log import AnswerLog
+from src.database.base import Session
+from src.database.models import AnswerEvent
+
+def test_answers_reach_stats_after_flush(user_id):
+    log = AnswerLog(batch_size=100, interval=60)
+    try:
+        log.record(user_id, 1, True)
+        log.record(user_id, 2, False)
+        assert log.pending(user_id) == (2, 1)
+
+        assert log.flush() == 2
+
+        assert log.pending(user_id) == (0, 0)
+        with Session() as session:
+            assert session.scalar(select(func.count(AnswerEvent.id))) == 2
+    finally:
+        log.close()
+
+def test_stats_count_each_answer_once(user_id):
+    queries.log_answer(user_id, 1, True)
+    queries.log_answer(user_id, 2, False)
+    queries.log_answer(user_id, 3, True)
+
+    assert queries.get_user_stats(user_id) == {'answers': 3, 'correct': 2}
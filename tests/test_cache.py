@@ -0,0 +1,40 @@
+import re
+from src.bot.cache import DeckCache
+from src.metrics import registry
+
+def _counter(name: str, labels: str = "") -> float:
+    match = re.search(rf"^{name}{re.escape(labels)} (\S+)$", registry.render(), re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+def test_deck_cache_is_lru():
+    cache = DeckCache(maxsize=2, ttl=60)
+    cache.put(1, [])
+    cache.put(2, [])
+    cache.get(1)
+
+    cache.put(3, [])
+
+    assert cache.get(2) is None
+    assert cache.get(1) == [] and cache.get(3) == []
+
+def test_deck_cache_expires():
+    cache = DeckCache(maxsize=2, ttl=-1)
+    cache.put(1, [])
+
+    assert cache.get(1) is None
+    assert cache.stats()['size'] == 0
+
+def test_deck_cache_counters_reach_metrics():
+    hits = _counter("bot_deck_cache_total", '{result="hit"}')
+    misses = _counter("bot_deck_cache_total", '{result="miss"}')
+    evictions = _counter("bot_deck_cache_evictions_total")
+    cache = DeckCache(maxsize=1, ttl=60)
+
+    cache.get(1)
+    cache.put(1, [])
+    cache.get(1)
+    cache.put(2, [])
+
+    assert _counter("bot_deck_cache_total", '{result="hit"}') == hits + 1
+    assert _counter("bot_deck_cache_total", '{result="miss"}') == misses + 1
+    assert _counter("bot_deck_cache_evictions_total") == evictions + 1
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from src.bot import queries
+from src.database.base import Session, seed_reviews
+from src.database.models import Review
+
+def _skip_through(user_id: int, count: int) -> list[int]:
+    """Показывает count карточек подряд, каждую пропуская кнопкой "Дальше" """
+    seen, previous = [], ""
+    for _ in range(count):
+        target, _ = queries.get_card(user_id, previous)
+        assert queries.skip_word(user_id, target['id'])
+        seen.append(target['id'])
+        previous = target['rus']
+    return seen
+
+def test_skip_moves_through_new_words(user_id):
+    base = queries.get_base_dictionary_cache().get()
+
+    seen = _skip_through(user_id, len(base))
+
+    assert sorted(seen) == sorted(base.ids)
+
+def test_skip_moves_through_due_words(user_id):
+    base = queries.get_base_dictionary_cache().get()
+    now = datetime.now(timezone.utc)
+    with Session() as session:
+        for offset, word_id in enumerate(base.ids):
+            seed_reviews(session, user_id, [word_id], due_at=now - timedelta(hours=len(base) - offset))
+        session.commit()
+
+    seen = _skip_through(user_id, len(base))
+
+    assert sorted(seen) == sorted(base.ids)
+
+def test_skip_does_not_bring_later_review_forward(user_id):
+    word_id = queries.get_base_dictionary_cache().get().ids[0]
+    due_at = datetime.now(timezone.utc) + timedelta(days=3)
+    with Session() as session:
+        seed_reviews(session, user_id, [word_id], due_at=due_at)
+        session.commit()
+
+    assert queries.skip_word(user_id, word_id)
+
+    with Session() as session:
+        review = session.scalar(select(Review).where(Review.id_user == user_id, Review.id_word == word_id))
+    assert review.due_at.replace(tzinfo=timezone.utc) >= due_at - timedelta(seconds=1)
+
+def _review(user_id: int, word_id: int) -> Review:
+    with Session() as session:
+        return session.scalar(select(Review).where(Review.id_user == user_id, Review.id_word == word_id))
+
+def test_correct_answers_grow_interval(user_id):
+    word_id = queries.get_base_dictionary_cache().get().ids[0]
+
+    intervals = []
+    for _ in range(3):
+        assert queries.record_answer(user_id, word_id, True)
+        intervals.append(_review(user_id, word_id).interval)
+
+    assert intervals == [1, 6, round(6 * 2.7, 1)]
+    assert _review(user_id, word_id).repetitions == 3
+
+def test_wrong_answer_resets_interval_and_lowers_ease(user_id):
+    word_id = queries.get_base_dictionary_cache().get().ids[0]
+    queries.record_answer(user_id, word_id, True)
+    queries.record_answer(user_id, word_id, True)
+
+    queries.record_answer(user_id, word_id, False)
+
+    review = _review(user_id, word_id)
+    assert (review.interval, review.repetitions) == (0, 0)
+    assert review.ease == 2.5 + 0.1 + 0.1 - 0.2
+    due_in = review.due_at.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+    assert timedelta(minutes=9) < due_in <= timedelta(minutes=10)
+
+def test_due_word_comes_before_new_words(user_id):
+    base = queries.get_base_dictionary_cache().get()
+    word_id = base.ids[-1]
+    with Session() as session:
+        seed_reviews(session, user_id, [word_id], due_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+        session.commit()
+
+    target, _ = queries.get_card(user_id, "")
+
+    assert target['id'] == word_id
+
+def test_card_options_have_one_right_answer(user_id):
+    previous = ""
+    for _ in range(10):
+        target, options = queries.get_card(user_id, previous)
+
+        assert len(options) == 4 and options[0] == target
+        assert len({word['rus'] for word in options}) == 4
+        assert len({word['eng'].lower() for word in options}) == 4
+        assert all(word['rus'] != previous for word in options)
+        queries.record_answer(user_id, target['id'], True)
+        previous = target['rus']
+
+def test_answered_words_are_not_shown_again_soon(user_id):
+    base = queries.get_base_dictionary_cache().get()
+    previous, seen = "", []
+    for _ in range(len(base)):
+        target, _ = queries.get_card(user_id, previous)
+        queries.record_answer(user_id, target['id'], True)
+        seen.append(target['id'])
+        previous = target['rus']
+
+    assert sorted(seen) == sorted(base.ids)
@@ -0,0 +1,35 @@
+from sqlalchemy import func, select
+from src.database.base import Session
+from src.database.distractors import DistractorIndexer, count_unindexed_words, edit_distances, index_new_words
+from src.database.models import WordDistractor
+
+def _levenshtein(a: str, b: str) -> int:
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(b, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != other))
+    return row[-1]
+
+def test_edit_distances_match_levenshtein():
+    words = ["", "a", "cat", "cart", "chart", "peace", "piece", "universe", "mouse"]
+
+    distances = edit_distances(words, words)
+
+    assert distances.tolist() == [[_levenshtein(a, b) for b in words] for a in words]
+
+def test_index_new_words_builds_lists(database):
+    assert count_unindexed_words() > 0
+
+    index_new_words(count=3)
+
+    assert count_unindexed_words() == 0
+    with Session() as session:
+        assert session.scalar(select(func.max(WordDistractor.rank))) == 2
+
+def test_indexer_leaves_large_backlog_to_cli(database):
+    indexer = DistractorIndexer(0, max_new=1)
+
+    indexer._index()
+
+    assert count_unindexed_words() > 1
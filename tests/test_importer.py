@@ -0,0 +1,29 @@
+import io
+import pytest
+from src.bot import queries
+from src.config import get_settings
+from src.database.importer import import_words, read_words
+
+def test_import_rejects_values_with_spaces(user_id):
+    rows = read_words(io.StringIO("rus,eng\nПривет мир,Hello world\n Кот ,cat\n"), "csv")
+
+    result = import_words(rows, user_id=user_id)
+
+    assert (result.added, result.linked, result.invalid) == (1, 1, 1)
+    assert ("Кот", "Cat") in queries.get_user_words(user_id)
+    assert ("Приветмир", "Helloworld") not in queries.get_user_words(user_id)
+
+def test_import_user_words_is_capped(user_id, monkeypatch):
+    monkeypatch.setenv("IMPORT_MAX_WORDS", "2")
+    get_settings.cache_clear()
+    stream = io.StringIO("Кот,Cat\nПес,Dog\nДом,House\n")
+
+    result = queries.import_user_words(user_id, stream, "csv")
+
+    assert result.truncated
+    assert result.linked == 2
+    assert ("Дом", "House") not in queries.get_user_words(user_id)
+
+def test_read_words_rejects_malformed_json():
+    with pytest.raises(ValueError):
+        list(read_words(io.StringIO('["Кот", "Cat"]'), "json"))
@@ -0,0 +1,46 @@
+from sqlalchemy import func, inspect, select, text
+from src.database.base import Session
+from src.database.migrations import LATEST_VERSION, current_version, migrate
+from src.database.models import DictionaryVersion, Review, User, UserWord, Word
+
+def test_new_database_gets_latest_schema_and_base_words(empty_database):
+    assert current_version(empty_database) is None
+
+    assert migrate(empty_database) == LATEST_VERSION
+
+    assert current_version(empty_database) == LATEST_VERSION
+    with Session() as session:
+        assert session.scalar(select(func.count(Word.id)).where(Word.is_main)) > 0
+        assert session.scalar(select(DictionaryVersion.version)) >= 1
+
+def test_migrate_is_idempotent(database):
+    with Session() as session:
+        words = session.scalar(select(func.count(Word.id)))
+
+    assert migrate(database) == LATEST_VERSION
+
+    with Session() as session:
+        assert session.scalar(select(func.count(Word.id))) == words
+
+def test_legacy_database_is_upgraded(empty_database):
+    # Схема до версионных миграций: без уникальных индексов, курсора новых слов и служебных таблиц
+    with empty_database.begin() as conn:
+        conn.execute(text('CREATE TABLE "user" (id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL UNIQUE, telegram_username VARCHAR)'))
+        conn.execute(text("CREATE TABLE word (id INTEGER PRIMARY KEY, rus VARCHAR NOT NULL, eng VARCHAR NOT NULL, "
+                          "number INTEGER NOT NULL, is_main BOOLEAN NOT NULL)"))
+        conn.execute(text("CREATE TABLE userword (id INTEGER PRIMARY KEY, id_user INTEGER NOT NULL REFERENCES user (id), "
+                          "id_word INTEGER NOT NULL REFERENCES word (id))"))
+        conn.execute(text('INSERT INTO "user" (id, telegram_id, telegram_username) VALUES (1, 100, \'old\')'))
+        conn.execute(text("INSERT INTO word (id, rus, eng, number, is_main) VALUES "
+                          "(1, 'Мир', 'Peace', 1, TRUE), (2, 'Кот', 'Cat', 1, FALSE), (3, 'Кот', 'Cat', 1, FALSE)"))
+        conn.execute(text("INSERT INTO userword (id_user, id_word) VALUES (1, 1), (1, 2), (1, 3), (1, 2)"))
+
+    assert migrate(empty_database) == LATEST_VERSION
+
+    assert "new_word_cursor" in {column["name"] for column in inspect(empty_database).get_columns("user")}
+    with Session() as session:
+        assert session.execute(select(Word.id, Word.rus).order_by(Word.id)).all() == [(1, "Мир"), (2, "Кот")]
+        # Связь с базовым словом и повторные связи удалены, собственное слово стоит в расписании
+        assert session.scalars(select(UserWord.id_word).where(UserWord.id_user == 1)).all() == [2]
+        assert session.scalars(select(Review.id_word).where(Review.id_user == 1)).all() == [2]
+        assert session.scalar(select(User.new_word_cursor).where(User.id == 1)) == 0
@@ -0,0 +1,92 @@
+import time
+from threading import Lock
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+from src.bot.outbox import Outbox, TokenBucket
+
+class _Bot:
+    """Заглушка TeleBot: запоминает отправленные сообщения, первые failures отправок получают 429"""
+
+    def __init__(self, failures: int = 0):
+        self.sent = []
+        self.failures = failures
+        self._lock = Lock()
+
+    def send_message(self, chat_id, text, reply_markup=None):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ApiTelegramException("sendMessage", None, {
+                    'error_code': 429, 'description': "Too Many Requests", 'parameters': {'retry_after': 0.05},
+                })
+            self.sent.append((chat_id, text, time.monotonic()))
+
+def _keyboard() -> types.ReplyKeyboardMarkup:
+    markup = types.ReplyKeyboardMarkup()
+    markup.add(types.KeyboardButton("Дальше"))
+    return markup
+
+def test_messages_without_keyboard_are_coalesced():
+    bot = _Bot()
+    outbox = Outbox(bot, workers=1, global_rate=1000, chat_rate=1000, chat_burst=100)
+    # Пока условие занято, поток отправки не заберет первое сообщение раньше остальных
+    with outbox._cond:
+        outbox.send(1, "Верный ответ!")
+        outbox.send(1, "Сейчас вы изучаете 12 слов")
+        outbox.send(1, "Выбери перевод слова", reply_markup=_keyboard())
+        outbox.send(1, "Следующее")
+    outbox.close()
+
+    assert [text for _, text, _ in bot.sent] == [
+        "Верный ответ!\n\nСейчас вы изучаете 12 слов\n\nВыбери перевод слова",
+        "Следующее",
+    ]
+
+def test_chat_rate_is_respected():
+    bot = _Bot()
+    outbox = Outbox(bot, workers=2, global_rate=1000, chat_rate=20, chat_burst=1)
+
+    for index in range(3):
+        outbox.send(1, f"Сообщение {index}", reply_markup=_keyboard())
+    outbox.close()
+
+    assert [text for _, text, _ in bot.sent] == ["Сообщение 0", "Сообщение 1", "Сообщение 2"]
+    assert bot.sent[-1][2] - bot.sent[0][2] >= 2 / 20 * 0.9
+
+def test_too_many_requests_is_retried_in_order():
+    bot = _Bot(failures=1)
+    outbox = Outbox(bot, workers=1, global_rate=1000, chat_rate=1000, chat_burst=100)
+
+    outbox.send(1, "Первое", reply_markup=_keyboard())
+    outbox.send(1, "Второе", reply_markup=_keyboard())
+    outbox.close()
+
+    assert [text for _, text, _ in bot.sent] == ["Первое", "Второе"]
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated
+
+    bucket.take(now)
+    bucket.take(now)
+
+    assert abs(bucket.delay(now) - 0.1) < 1e-9
+    assert bucket.delay(now + 0.1) == 0
+
+def test_dispatcher_workers_share_global_rate(monkeypatch):
+    from src.bot import core
+    from src.config import get_settings
+
+    monkeypatch.setenv("TG_TOKEN", "123456:TEST")
+    monkeypatch.setenv("DISPATCH_WORKERS", "4")
+    monkeypatch.setenv("OUTBOX_GLOBAL_RATE", "30")
+    monkeypatch.setenv("STATE_STORAGE", "memory")
+    for cached in (get_settings, core.get_bot, core.get_outbox):
+        cached.cache_clear()
+    try:
+        outbox = core.get_outbox()
+        outbox.close()
+        assert outbox._global.rate == 7.5
+    finally:
+        for cached in (get_settings, core.get_bot, core.get_outbox):
+            cached.cache_clear()
@@ -0,0 +1,62 @@
+import time
+from src.bot.prefetch import CardPrefetch
+
+def _card(word_id: int) -> tuple[dict, list[dict]]:
+    word = {'id': word_id, 'rus': f"Слово{word_id}", 'eng': f"Word{word_id}"}
+    return word, [word]
+
+class _Deck:
+    """Выдает карточки по порядку, пропуская исключенные"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous_word, exclude_ids):
+        self.calls.append((previous_word, list(exclude_ids)))
+        word_id = max([0, *exclude_ids]) + 1
+        return _card(word_id)
+
+def _wait(prefetch: CardPrefetch, user_id: int, size: int) -> None:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        ring = prefetch._rings.get(user_id)
+        if ring is not None and len(ring.cards) >= size and not ring.pending:
+            return
+        time.sleep(0.01)
+    raise AssertionError("карточки не вытянуты")
+
+def test_prefetch_follows_the_chain():
+    prefetch, deck = CardPrefetch(depth=2, workers=1), _Deck()
+    current = _card(1)[0]
+
+    prefetch.refill(7, current, deck)
+    _wait(prefetch, 7, 2)
+
+    assert deck.calls == [("Слово1", [1]), ("Слово2", [1, 2])]
+    assert prefetch.pop(7, "Слово1") == _card(2)
+    assert prefetch.pop(7, "Слово2") == _card(3)
+    assert prefetch.pop(7, "Слово3") is None
+
+def test_prefetch_is_dropped_when_user_leaves_the_chain():
+    prefetch, deck = CardPrefetch(depth=2, workers=1), _Deck()
+    prefetch.refill(7, _card(1)[0], deck)
+    _wait(prefetch, 7, 2)
+
+    assert prefetch.pop(7, "Другое") is None
+    assert prefetch.pop(7, "Слово1") is None
+
+def test_invalidate_drops_cards():
+    prefetch, deck = CardPrefetch(depth=1, workers=1), _Deck()
+    prefetch.refill(7, _card(1)[0], deck)
+    _wait(prefetch, 7, 1)
+
+    prefetch.invalidate(7)
+
+    assert prefetch.pop(7, "Слово1") is None
+
+def test_disabled_prefetch_never_fetches():
+    prefetch, deck = CardPrefetch(depth=0), _Deck()
+
+    prefetch.refill(7, _card(1)[0], deck)
+
+    assert deck.calls == [] and prefetch.pop(7, "Слово1") is None
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine
+from src.bot.storage import DatabaseStateStorage
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'state.db'}")
+    yield engine
+    engine.dispose()
+
+def test_state_survives_restart(engine):
+    storage = DatabaseStateStorage(engine, flush_interval=0.05)
+    storage.set_state(1, 1, "target_word")
+    storage.set_data(1, 1, "card", [1, 2, 3])
+    storage.close()
+
+    restarted = DatabaseStateStorage(engine, flush_interval=0)
+
+    assert restarted.get_state(1, 1) == "target_word"
+    assert restarted.get_data(1, 1) == {"card": [1, 2, 3]}
+
+def test_write_through_without_flush_interval(engine):
+    storage = DatabaseStateStorage(engine, flush_interval=0, cache_ttl=0)
+    other = DatabaseStateStorage(engine, flush_interval=0, cache_ttl=0)
+
+    storage.set_state(1, 1, "wait_word")
+    assert other.get_state(1, 1) == "wait_word"
+    other.delete_state(1, 1)
+    assert storage.get_state(1, 1) is None
+
+def test_cache_is_bounded(engine):
+    storage = DatabaseStateStorage(engine, flush_interval=0, cache_size=10)
+
+    for chat_id in range(100):
+        storage.set_state(chat_id, chat_id, "target_word")
+
+    assert len(storage._cache) == 10
+    assert storage.get_state(0, 0) == "target_word"
+
+def test_deleted_state_leaves_cache_after_flush(engine):
+    storage = DatabaseStateStorage(engine, flush_interval=0)
+    storage.set_state(1, 1, "target_word")
+
+    storage.delete_state(1, 1)
+
+    assert storage._cache == {}
+    assert storage.get_state(1, 1) is None
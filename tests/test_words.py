@@ -0,0 +1,61 @@
+from sqlalchemy import select
+from src.bot import queries
+from src.database.base import Session
+from src.database.cleanup import sweep_orphan_words
+from src.database.models import Review, Word
+
+def _word(rus: str, eng: str) -> dict:
+    with Session() as session:
+        return session.scalar(select(Word).where(Word.rus == rus, Word.eng == eng)).to_dict()
+
+def test_add_word_creates_versions(user_id):
+    assert queries.add_user_word(user_id, "Кот", "Cat") == (True, "Слово успешно добавлено")
+    assert queries.add_user_word(user_id, "Кот", "Cat") == (False, "Слово уже существует в вашем словаре")
+    assert queries.add_user_word(user_id, "Кот", "Tomcat") == (True, "Создана новая версия слова")
+
+    assert _word("Кот", "Tomcat")['number'] == 2
+    pairs = queries.get_user_words(user_id)
+    assert ("Кот", "Cat") in pairs and ("Кот", "Tomcat") in pairs
+
+def test_add_existing_word_links_it_to_another_user(user_id):
+    other_id, _ = queries.get_or_create_user(2, "other")
+    queries.add_user_word(other_id, "Кот", "Cat")
+
+    assert queries.add_user_word(user_id, "Кот", "Cat") == (True, "Слово добавлено в словарь")
+    assert queries.count_user_words(user_id) == queries.count_user_words(other_id)
+
+def test_base_word_is_not_added_again(user_id):
+    count = queries.count_user_words(user_id)
+
+    assert queries.add_user_word(user_id, "Солнце", "Sun") == (False, "Слово уже существует в вашем словаре")
+    assert queries.count_user_words(user_id) == count
+
+def test_added_word_is_due_at_once(user_id):
+    queries.add_user_word(user_id, "Кот", "Cat")
+    word = _word("Кот", "Cat")
+
+    target, options = queries.get_card(user_id, "")
+
+    assert target == word
+    assert word in options
+
+def test_delete_word_removes_link_and_schedule(user_id):
+    queries.add_user_word(user_id, "Кот", "Cat")
+    word = _word("Кот", "Cat")
+    count = queries.count_user_words(user_id)
+
+    assert queries.delete_user_word(user_id, word)
+
+    assert queries.count_user_words(user_id) == count - 1
+    assert ("Кот", "Cat") not in queries.get_user_words(user_id)
+    with Session() as session:
+        assert session.scalar(select(Review).where(Review.id_word == word['id'])) is None
+    assert sweep_orphan_words() == 1
+    with Session() as session:
+        assert session.get(Word, word['id']) is None
+
+def test_base_word_cannot_be_deleted(user_id):
+    word = _word("Солнце", "Sun")
+
+    assert not queries.delete_user_word(user_id, word)
+    assert ("Солнце", "Sun") in queries.get_user_words(user_id)